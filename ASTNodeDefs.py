@@ -1,5 +1,32 @@
+from zlib import crc32
+
+# Structural hashing. Built-in str hashes are salted per process, so strings go through crc32
+# and only ints, floats and tuples of them reach hash(); digests then agree across runs and
+# across ParallelParser's worker processes.
+def text_hash(text):
+    return crc32(text.encode()) if text is not None else 0
+
+def digest_of(node):
+    return node.digest if node is not None else 0
+
 # Base class for all AST nodes
 class ASTNode:
+    # Source span as offsets into the code: [start, end). Set by the parser on every node.
+    start = None
+    end = None
+    _digest = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.kind_hash = crc32(cls.__name__.encode())
+
+    @property
+    def digest(self):
+        """Merkle hash of the subtree: equal for structurally equal subtrees, spans ignored. Cached."""
+        if self._digest is None:
+            self._digest = self.compute_digest()
+        return self._digest
+
     def to_string(self):
         """Method to provide compact string representation without newlines."""
         return repr(self)
@@ -17,8 +44,13 @@ class Assignment(ASTNode):
         expr_str = self.expression.to_string() if isinstance(self.expression, ASTNode) else repr(self.expression)
         return f"Assignment({self.identifier}, {expr_str})"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, text_hash(self.identifier), self.expression.digest))
+
 # Class for variable declarations: int x = expression or float x = expression
 class Declaration(ASTNode):
+    name_start = None  # offset of the identifier; set by the parser like start/end
+
     def __init__(self, var_type, identifier, expression=None):
         self.var_type = var_type  # 'int' or 'float'
         self.identifier = identifier
@@ -32,6 +64,9 @@ class Declaration(ASTNode):
         expr_str = self.expression.to_string() if isinstance(self.expression, ASTNode) else repr(self.expression)
         return f"Declaration({self.var_type}, {self.identifier}, {expr_str})"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, text_hash(self.var_type), text_hash(self.identifier), digest_of(self.expression)))
+
 # Class for binary operations: term1 + term2
 class BinaryOperation(ASTNode):
     def __init__(self, left, operator, right, value_type=None):
@@ -48,6 +83,9 @@ class BinaryOperation(ASTNode):
         right_str = self.right.to_string() if isinstance(self.right, ASTNode) else repr(self.right)
         return f"BinaryOperation({left_str}, {self.operator}, {right_str}, type={self.value_type})"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, self.left.digest, text_hash(self.operator), self.right.digest, text_hash(self.value_type)))
+
 # Class for boolean expressions: x != 10
 class BooleanExpression(ASTNode):
     def __init__(self, left, operator, right):
@@ -63,6 +101,9 @@ class BooleanExpression(ASTNode):
         right_str = self.right.to_string() if isinstance(self.right, ASTNode) else repr(self.right)
         return f"BooleanExpression({left_str}, {self.operator}, {right_str})"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, self.left.digest, text_hash(self.operator), self.right.digest))
+
 # Class for function calls: foobar(arg1, arg2)
 class FunctionCall(ASTNode):
     def __init__(self, function_name, arguments):
@@ -77,6 +118,9 @@ class FunctionCall(ASTNode):
         args_str = ", ".join(arg.to_string() if isinstance(arg, ASTNode) else repr(arg) for arg in self.arguments)
         return f"FunctionCall({self.function_name}, [{args_str}])"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, text_hash(self.function_name)) + tuple(arg.digest for arg in self.arguments))
+
 # Class for if statements
 class IfStatement(ASTNode):
     def __init__(self, condition, then_block, else_block=None):
@@ -94,6 +138,9 @@ class IfStatement(ASTNode):
         else_str = self.else_block.to_string() if self.else_block is not None else "None"
         return f"IfStatement({condition_str}, {then_str}, {else_str})"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, self.condition.digest, self.then_block.digest, digest_of(self.else_block)))
+
 # Class for while statements
 class WhileStatement(ASTNode):
     def __init__(self, condition, block):
@@ -108,6 +155,9 @@ class WhileStatement(ASTNode):
         block_str = self.block.to_string() if isinstance(self.block, ASTNode) else repr(self.block)
         return f"WhileStatement({condition_str}, {block_str})"
 
+    def compute_digest(self):
+        return hash((self.kind_hash, self.condition.digest, self.block.digest))
+
 # Class for blocks
 class Block(ASTNode):
     def __init__(self, statements):
@@ -121,6 +171,31 @@ class Block(ASTNode):
         statement_strs = ", ".join(stmt.to_string() if isinstance(stmt, ASTNode) else repr(stmt) for stmt in self.statements)
         return f"Block([{statement_strs}])"
 
+    def compute_digest(self):
+        return hash((Block.kind_hash,) + tuple(stmt.digest for stmt in self.statements))
+
+# Block whose statements are parsed on first access (Parser lazy mode)
+class LazyBlock(Block):
+    def __init__(self, parser, open_index, scope_number, depth, snapshot):
+        self.parser = parser
+        self.open_index = open_index  # token index of the '{'
+        self.scope_number = scope_number  # the block is parsed as scope_<scope_number>
+        self.depth = depth  # nesting levels around the block, counted against Budget.max_depth
+        self.snapshot = snapshot  # [(scope name, number of visible symbols)] when the block was reached
+        self.block = None
+
+    @property
+    def statements(self):
+        if self.block is None:
+            self.block = self.parser.force_block(self)
+            self.parser = self.snapshot = None
+        return self.block.statements
+
+    @property
+    def digest(self):
+        self.statements
+        return self.block.digest
+
 # Class for factors (literals or variables) in expressions
 class Factor(ASTNode):
     def __init__(self, value, value_type):
@@ -132,3 +207,73 @@ class Factor(ASTNode):
 
     def to_string(self):
         return f"Factor(value={self.value}, type={self.value_type})"
+
+    def compute_digest(self):
+        if isinstance(self.value, str):
+            # an identifier; the extra element keeps it apart from any numeric literal
+            return hash((self.kind_hash, text_hash(self.value_type), text_hash(self.value), 0))
+        return hash((self.kind_hash, text_hash(self.value_type), self.value))
+
+# Builds the expression nodes for the parser (one new object per call)
+class NodeFactory:
+    created = 0  # nodes built so far (counted against Budget.max_nodes)
+
+    def locate(self, node, start, end):
+        self.created += 1
+        node.start = start
+        node.end = end
+        node._digest = node.compute_digest()  # children are done already, so this is one hash
+        return node
+
+    def factor(self, value, value_type, start=None, end=None):
+        return self.locate(Factor(value, value_type), start, end)
+
+    def binary_operation(self, left, operator, right, value_type=None, start=None, end=None):
+        return self.locate(BinaryOperation(left, operator, right, value_type), start, end)
+
+    def boolean_expression(self, left, operator, right, start=None, end=None):
+        return self.locate(BooleanExpression(left, operator, right), start, end)
+
+# Hash-consing factory: structurally identical expression subtrees share one object.
+# A shared node stands for every place it occurs, so expression nodes get no span.
+class HashConsFactory(NodeFactory):
+    def __init__(self):
+        self.table = {}   # (kind, operator, child ids, value, value_type) -> node
+        self.counts = {}  # id(node) -> number of times the subtree was requested
+
+    def locate(self, node, start, end):
+        return super().locate(node, None, None)
+
+    def intern(self, key, build):
+        """Return the shared node for `key`, building it on first use."""
+        node = self.table.get(key)
+        if node is None:
+            node = build()
+            self.table[key] = node
+            self.counts[id(node)] = 1
+        else:
+            self.counts[id(node)] += 1
+        return node
+
+    def factor(self, value, value_type, start=None, end=None):
+        key = ('Factor', None, (), value, value_type)
+        return self.intern(key, lambda: self.locate(Factor(value, value_type), start, end))
+
+    def binary_operation(self, left, operator, right, value_type=None, start=None, end=None):
+        # children are already interned, so their ids identify them structurally
+        key = ('BinaryOperation', operator, (id(left), id(right)), None, value_type)
+        return self.intern(key, lambda: self.locate(BinaryOperation(left, operator, right, value_type), start, end))
+
+    def boolean_expression(self, left, operator, right, start=None, end=None):
+        key = ('BooleanExpression', operator, (id(left), id(right)), None, None)
+        return self.intern(key, lambda: self.locate(BooleanExpression(left, operator, right), start, end))
+
+    def cse_report(self):
+        """
+        Lists the repeated compound subexpressions as (node, count) pairs,
+        most repeated first. Leaf factors are left out since sharing them is trivial.
+        """
+        report = [(node, self.counts[id(node)]) for node in self.table.values()
+                  if not isinstance(node, Factor) and self.counts[id(node)] > 1]
+        report.sort(key=lambda entry: entry[1], reverse=True)
+        return report
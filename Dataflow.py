@@ -0,0 +1,280 @@
+from collections import deque
+
+import ASTNodeDefs as AST
+
+# A variable binding: one per declaration that the parser accepted
+class Variable:
+    def __init__(self, index, name, scope, declaration, declaration_seq):
+        self.index = index  # bit position in liveness bitsets
+        self.name = name
+        self.scope = scope  # 'global' or 'scope_N', same names as Parser.symbol_table
+        self.declaration = declaration
+        self.declaration_seq = declaration_seq
+        self.defs = 0  # bitset of every definition id of this variable
+        self.uses = 0  # number of reads anywhere in the program
+
+# One straight-line step: reads `uses`, then writes `var` (definition id `def_id`)
+class Instruction:
+    def __init__(self, seq, node, uses, var=None, def_id=-1, unassigned=False):
+        self.seq = seq  # program order, used to report findings in source order
+        self.node = node
+        self.uses = uses  # list of (Variable, Factor) pairs
+        self.var = var
+        self.def_id = def_id
+        self.unassigned = unassigned  # declaration point: the variable exists but holds no value yet
+
+class BasicBlock:
+    def __init__(self, index):
+        self.index = index
+        self.instructions = []
+        self.successors = []
+        self.predecessors = []
+
+# Control-flow graph over Block / IfStatement / WhileStatement.
+# Variables are resolved with the same scoping rules the parser uses.
+class ControlFlowGraph:
+    def __init__(self, program):
+        self.blocks = []
+        self.variables = []
+        self.definitions = []  # def id -> Instruction
+        self.scope_counter = 0
+        self.scope_stack = [('global', {})]
+        self.seq = 0
+        self.entry = self.new_block()
+        self.exit = self.build(program.statements, self.entry)
+
+    def new_block(self):
+        block = BasicBlock(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def link(self, source, target):
+        source.successors.append(target)
+        target.predecessors.append(source)
+
+    def lookup(self, name):
+        for _, names in reversed(self.scope_stack):
+            if name in names:
+                return names[name]
+        return None  # undeclared; the parser has already reported it
+
+    def uses_of(self, node, uses):
+        # an explicit stack: the parser builds long operator chains without recursing, so must this
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, AST.Factor):
+                if isinstance(node.value, str):
+                    var = self.lookup(node.value)
+                    if var is not None:
+                        uses.append((var, node))
+            elif isinstance(node, (AST.BinaryOperation, AST.BooleanExpression)):
+                stack.append(node.right)
+                stack.append(node.left)
+            elif isinstance(node, AST.FunctionCall):
+                stack.extend(reversed(node.arguments))
+        return uses
+
+    def emit(self, block, node, uses, var=None, unassigned=False):
+        def_id = -1
+        if var is not None:
+            def_id = len(self.definitions)
+            var.defs |= 1 << def_id
+        for used, _ in uses:
+            used.uses += 1
+        instruction = Instruction(self.seq, node, uses, var, def_id, unassigned)
+        self.seq += 1
+        block.instructions.append(instruction)
+        if var is not None:
+            self.definitions.append(instruction)
+
+    def enter_scope(self):
+        self.scope_counter += 1
+        self.scope_stack.append((f'scope_{self.scope_counter}', {}))
+
+    def exit_scope(self):
+        self.scope_stack.pop()
+
+    def build_block(self, block, current):
+        self.enter_scope()
+        current = self.build(block.statements, current)
+        self.exit_scope()
+        return current
+
+    def build(self, statements, current):
+        """Adds `statements` starting in `current`; returns the block control ends up in."""
+        for stmt in statements:
+            if isinstance(stmt, AST.Declaration):
+                scope, names = self.scope_stack[-1]
+                var = names.get(stmt.identifier)
+                if var is None:
+                    var = Variable(len(self.variables), stmt.identifier, scope, stmt, self.seq)
+                    self.variables.append(var)
+                    names[stmt.identifier] = var
+                    # a fresh variable: kills whatever an earlier loop iteration left behind
+                    self.emit(current, stmt, [], var, unassigned=True)
+                # a redeclaration in the same scope is reported by the parser and acts as an assignment
+                if stmt.expression is not None:
+                    self.emit(current, stmt, self.uses_of(stmt.expression, []), var)
+            elif isinstance(stmt, AST.Assignment):
+                uses = self.uses_of(stmt.expression, [])
+                self.emit(current, stmt, uses, self.lookup(stmt.identifier))
+            elif isinstance(stmt, AST.FunctionCall):
+                self.emit(current, stmt, self.uses_of(stmt, []))
+            elif isinstance(stmt, AST.IfStatement):
+                self.emit(current, stmt.condition, self.uses_of(stmt.condition, []))
+                join = self.new_block()
+                then_entry = self.new_block()
+                self.link(current, then_entry)
+                self.link(self.build_block(stmt.then_block, then_entry), join)
+                if stmt.else_block is not None:
+                    else_entry = self.new_block()
+                    self.link(current, else_entry)
+                    self.link(self.build_block(stmt.else_block, else_entry), join)
+                else:
+                    self.link(current, join)
+                current = join
+            elif isinstance(stmt, AST.WhileStatement):
+                header = self.new_block()
+                self.link(current, header)
+                self.emit(header, stmt.condition, self.uses_of(stmt.condition, []))
+                body = self.new_block()
+                self.link(header, body)
+                self.link(self.build_block(stmt.block, body), header)
+                current = self.new_block()
+                self.link(header, current)
+        return current
+
+    def reverse_postorder(self):
+        order = []
+        seen = {self.entry.index}
+        stack = [(self.entry, iter(self.entry.successors))]
+        while stack:
+            block, successors = stack[-1]
+            for succ in successors:
+                if succ.index not in seen:
+                    seen.add(succ.index)
+                    stack.append((succ, iter(succ.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+def solve(order, transfer, neighbours, initial, join_from):
+    """
+    Iterative worklist solver over integer bitsets.
+    `order` seeds the worklist (reverse postorder for forward problems, postorder for
+    backward ones); `join_from(block)` lists the blocks whose results flow into `block`
+    and `neighbours(block)` the blocks to revisit when `block`'s result changes.
+    Returns (before, after) lists indexed by block index, in the direction of the analysis:
+    (IN, OUT) for a forward problem, (OUT, IN) for a backward one.
+    """
+    size = max(block.index for block in order) + 1
+    before = [0] * size
+    after = [initial] * size
+    queued = [False] * size
+    worklist = deque(order)
+    for block in order:
+        queued[block.index] = True
+    while worklist:
+        block = worklist.popleft()
+        queued[block.index] = False
+        incoming = 0
+        for source in join_from(block):
+            incoming |= after[source.index]
+        before[block.index] = incoming
+        result = transfer(block, incoming)
+        if result != after[block.index]:
+            after[block.index] = result
+            for target in neighbours(block):
+                if not queued[target.index]:
+                    queued[target.index] = True
+                    worklist.append(target)
+    return before, after
+
+# Reaching definitions: bit i set = definition i may reach this point
+def reaching_definitions(cfg):
+    gen = [0] * len(cfg.blocks)
+    kill = [0] * len(cfg.blocks)
+    for block in cfg.blocks:
+        for instruction in block.instructions:
+            if instruction.var is not None:
+                gen[block.index] = (gen[block.index] & ~instruction.var.defs) | (1 << instruction.def_id)
+                kill[block.index] |= instruction.var.defs
+
+    def transfer(block, incoming):
+        return gen[block.index] | (incoming & ~kill[block.index])
+
+    return solve(cfg.reverse_postorder(), transfer,
+                 lambda block: block.successors, 0, lambda block: block.predecessors)
+
+# Liveness: bit i set = variable i may be read before it is written again
+def liveness(cfg):
+    use = [0] * len(cfg.blocks)
+    define = [0] * len(cfg.blocks)
+    for block in cfg.blocks:
+        for instruction in block.instructions:
+            for var, _ in instruction.uses:
+                if not define[block.index] >> var.index & 1:
+                    use[block.index] |= 1 << var.index
+            if instruction.var is not None:
+                define[block.index] |= 1 << instruction.var.index
+
+    def transfer(block, live_out):
+        return use[block.index] | (live_out & ~define[block.index])
+
+    order = cfg.reverse_postorder()
+    order.reverse()
+    return solve(order, transfer, lambda block: block.predecessors, 0, lambda block: block.successors)
+
+# Unused declarations, dead assignments and use-before-assignment, reported like Parser.messages
+class DataflowAnalysis:
+    def __init__(self, program):
+        self.cfg = ControlFlowGraph(program)
+        self.messages = []
+        self.message_spans = []
+
+    def error(self, message, node):
+        self.messages.append(message)
+        self.message_spans.append((node.start, node.end))
+
+    def analyze(self):
+        cfg = self.cfg
+        findings = []  # (seq, message, node)
+
+        for var in cfg.variables:
+            if var.uses == 0:
+                findings.append((var.declaration_seq, f"Variable {var.name} is declared but never used", var.declaration))
+
+        reach_in, _ = reaching_definitions(cfg)
+        unassigned = 0
+        for instruction in cfg.definitions:
+            if instruction.unassigned:
+                unassigned |= 1 << instruction.def_id
+        for block in cfg.blocks:
+            reach = reach_in[block.index]
+            for instruction in block.instructions:
+                for var, node in instruction.uses:
+                    if reach & unassigned & var.defs:
+                        findings.append((instruction.seq, f"Variable {var.name} may be used before it is assigned", node))
+                if instruction.var is not None:
+                    reach = (reach & ~instruction.var.defs) | (1 << instruction.def_id)
+
+        live_out, _ = liveness(cfg)
+        for block in cfg.blocks:
+            live = live_out[block.index]
+            for instruction in reversed(block.instructions):
+                var = instruction.var
+                if var is not None:
+                    if not instruction.unassigned and var.uses and not live >> var.index & 1:
+                        findings.append((instruction.seq, f"Value assigned to {var.name} is never used", instruction.node))
+                    live &= ~(1 << var.index)
+                for used, _ in instruction.uses:
+                    live |= 1 << used.index
+
+        findings.sort(key=lambda finding: finding[0])
+        for _, message, node in findings:
+            self.error(message, node)
+        return self.messages
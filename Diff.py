@@ -0,0 +1,82 @@
+from difflib import SequenceMatcher
+
+import ASTNodeDefs as AST
+
+# One edit between two versions of a block: 'inserted', 'deleted' or 'modified'
+class Change:
+    def __init__(self, kind, old_index, new_index, old, new):
+        self.kind = kind
+        self.old_index = old_index  # position in the old block, None for an insertion
+        self.new_index = new_index  # position in the new block, None for a deletion
+        self.old = old
+        self.new = new
+        # for a modified if/while: (block attribute, [Change]) for each body that changed
+        self.nested = []
+
+    def __repr__(self):
+        node = self.new if self.new is not None else self.old
+        return f"Change({self.kind}, old={self.old_index}, new={self.new_index}, {node.to_string()})"
+
+# Statements whose bodies are compared recursively when both versions have the same kind
+BODIES = {
+    AST.IfStatement: ('then_block', 'else_block'),
+    AST.WhileStatement: ('block',),
+}
+
+def diff(old, new):
+    """
+    Statement-level changes turning Block `old` into Block `new`. Subtrees are compared by
+    digest, so identical ones are skipped without being walked: equal programs cost one
+    comparison, and otherwise only the common prefix and suffix are scanned before the
+    differing middle is matched and the modified if/while bodies are descended into.
+    """
+    if old.digest == new.digest:
+        return []
+    a = old.statements
+    b = new.statements
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix].digest == b[prefix].digest:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[-1 - suffix].digest == b[-1 - suffix].digest:
+        suffix += 1
+    a_middle = a[prefix:len(a) - suffix]
+    b_middle = b[prefix:len(b) - suffix]
+
+    changes = []
+    matcher = SequenceMatcher(None, [stmt.digest for stmt in a_middle],
+                              [stmt.digest for stmt in b_middle], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'replace':
+            changes.extend(pair_up(a_middle[i1:i2], b_middle[j1:j2], prefix + i1, prefix + j1))
+        elif tag == 'delete':
+            changes.extend(Change('deleted', prefix + i, None, a_middle[i], None) for i in range(i1, i2))
+        elif tag == 'insert':
+            changes.extend(Change('inserted', None, prefix + j, None, b_middle[j]) for j in range(j1, j2))
+    return changes
+
+def pair_up(a, b, a_base, b_base):
+    """A replaced run: statements of the same kind, matched in order, were modified; the rest were deleted or inserted."""
+    changes = []
+    matcher = SequenceMatcher(None, [type(stmt).__name__ for stmt in a],
+                              [type(stmt).__name__ for stmt in b], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for k in range(i2 - i1):
+                changes.append(modified(a_base + i1 + k, b_base + j1 + k, a[i1 + k], b[j1 + k]))
+            continue
+        changes.extend(Change('deleted', a_base + i, None, a[i], None) for i in range(i1, i2))
+        changes.extend(Change('inserted', None, b_base + j, None, b[j]) for j in range(j1, j2))
+    return changes
+
+def modified(old_index, new_index, old, new):
+    change = Change('modified', old_index, new_index, old, new)
+    if type(old) in BODIES:
+        for attribute in BODIES[type(old)]:
+            old_body = getattr(old, attribute) or AST.Block([])
+            new_body = getattr(new, attribute) or AST.Block([])
+            nested = diff(old_body, new_body)
+            if nested:
+                change.nested.append((attribute, nested))
+    return change
@@ -0,0 +1,249 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import ASTNodeDefs as AST
+import Parser as P
+import Scopes
+
+# Only braces and the keywords that always begin a statement matter to the splitter
+SPLIT_PATTERN = re.compile(r'[{}]|\b(?:int|float|if|while)\b')
+DECL_NAME = re.compile(r'\s*([^\W\d_]\w*)')
+
+
+def scan_top_level(code):
+    """
+    Finds where top-level statements may be split, in one pass over the raw text.
+    Returns (starts, declarations):
+      starts       - (offset, braces_before) for every 'int'/'float'/'if'/'while' at brace depth 0
+      declarations - (offset, name, type) for every top-level declaration, in source order
+    Statements that begin with an identifier are never split points; they simply stay
+    attached to the chunk before them.
+    """
+    starts = []
+    declarations = []
+    depth = 0
+    braces = 0
+    for match in SPLIT_PATTERN.finditer(code):
+        word = match.group()
+        if word == '{':
+            depth += 1
+            braces += 1
+        elif word == '}':
+            depth -= 1
+        elif depth == 0:
+            starts.append((match.start(), braces))
+            if word == 'int' or word == 'float':
+                name = DECL_NAME.match(code, match.end())
+                if name is not None:
+                    declarations.append((match.start(), name.group(1), word))
+    return starts, declarations
+
+
+# Statements travel between processes as one flat list instead of a pickled object graph,
+# which is several times slower to load than to build. Nodes are written children first,
+# each as [kind, start, end, digest, own fields...]; the decoder rebuilds them with a stack.
+FACTOR, BINARY, BOOLEAN, CALL, ASSIGNMENT, DECLARATION, IF, WHILE, BLOCK = range(9)
+
+
+def encode_statements(statements):
+    code = []
+    strings = {}  # one object per distinct string, so pickle writes each of them once
+    stack = [(statement, False) for statement in reversed(statements)]
+    while stack:
+        node, expanded = stack.pop()
+        kind = type(node)
+        if not expanded:
+            stack.append((node, True))
+            if kind is AST.BinaryOperation or kind is AST.BooleanExpression:
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            elif kind is AST.Assignment:
+                stack.append((node.expression, False))
+            elif kind is AST.Declaration:
+                if node.expression is not None:
+                    stack.append((node.expression, False))
+            elif kind is AST.IfStatement:
+                if node.else_block is not None:
+                    stack.append((node.else_block, False))
+                stack.append((node.then_block, False))
+                stack.append((node.condition, False))
+            elif kind is AST.WhileStatement:
+                stack.append((node.block, False))
+                stack.append((node.condition, False))
+            elif kind is AST.FunctionCall:
+                stack.extend((argument, False) for argument in reversed(node.arguments))
+            elif kind is AST.Block:
+                stack.extend((statement, False) for statement in reversed(node.statements))
+            continue
+        if kind is AST.Factor:
+            value = strings.setdefault(node.value, node.value) if isinstance(node.value, str) else node.value
+            code += (FACTOR, node.start, node.end, node._digest, value, strings.setdefault(node.value_type, node.value_type))
+        elif kind is AST.BinaryOperation:
+            code += (BINARY, node.start, node.end, node._digest, strings.setdefault(node.operator, node.operator),
+                     strings.setdefault(node.value_type, node.value_type))
+        elif kind is AST.BooleanExpression:
+            code += (BOOLEAN, node.start, node.end, node._digest, strings.setdefault(node.operator, node.operator))
+        elif kind is AST.Assignment:
+            code += (ASSIGNMENT, node.start, node.end, node._digest, strings.setdefault(node.identifier, node.identifier))
+        elif kind is AST.Declaration:
+            code += (DECLARATION, node.start, node.end, node._digest, strings.setdefault(node.var_type, node.var_type),
+                     strings.setdefault(node.identifier, node.identifier), node.name_start, node.expression is not None)
+        elif kind is AST.IfStatement:
+            code += (IF, node.start, node.end, node._digest, node.else_block is not None)
+        elif kind is AST.WhileStatement:
+            code += (WHILE, node.start, node.end, node._digest)
+        elif kind is AST.FunctionCall:
+            code += (CALL, node.start, node.end, node._digest, strings.setdefault(node.function_name, node.function_name),
+                     len(node.arguments))
+        else:
+            code += (BLOCK, node.start, node.end, node._digest, len(node.statements))
+    return code
+
+
+def decode_statements(code):
+    stack = []
+    i = 0
+    while i < len(code):
+        kind, start, end, digest = code[i:i + 4]
+        if kind == FACTOR:
+            node = AST.Factor(code[i + 4], code[i + 5])
+            i += 6
+        elif kind == BINARY:
+            right = stack.pop()
+            node = AST.BinaryOperation(stack.pop(), code[i + 4], right, code[i + 5])
+            i += 6
+        elif kind == BOOLEAN:
+            right = stack.pop()
+            node = AST.BooleanExpression(stack.pop(), code[i + 4], right)
+            i += 5
+        elif kind == ASSIGNMENT:
+            node = AST.Assignment(code[i + 4], stack.pop())
+            i += 5
+        elif kind == DECLARATION:
+            node = AST.Declaration(code[i + 4], code[i + 5], stack.pop() if code[i + 7] else None)
+            node.name_start = code[i + 6]
+            i += 8
+        elif kind == IF:
+            else_block = stack.pop() if code[i + 4] else None
+            then_block = stack.pop()
+            node = AST.IfStatement(stack.pop(), then_block, else_block)
+            i += 5
+        elif kind == WHILE:
+            block = stack.pop()
+            node = AST.WhileStatement(stack.pop(), block)
+            i += 4
+        elif kind == CALL:
+            count = code[i + 5]
+            node = AST.FunctionCall(code[i + 4], stack[len(stack) - count:])
+            del stack[len(stack) - count:]
+            i += 6
+        else:
+            count = code[i + 4]
+            node = AST.Block(stack[len(stack) - count:])
+            del stack[len(stack) - count:]
+            i += 5
+        node.start = start
+        node.end = end
+        node._digest = digest
+        stack.append(node)
+    return stack
+
+
+# The Block returned by ParallelParser.parse: each chunk's statements are decoded on first access
+class DecodedBlock(AST.Block):
+    def __init__(self, encoded):
+        self.encoded = encoded  # encode_statements output, one per chunk
+        self.decoded = None
+
+    @property
+    def statements(self):
+        if self.decoded is None:
+            self.decoded = [statement for code in self.encoded for statement in decode_statements(code)]
+            self.encoded = None
+        return self.decoded
+
+
+def parse_chunk(text, offset, global_symbols, scope_counter):
+    """Worker: lex and parse one chunk as if everything before it had already been parsed."""
+    parser = P.Parser(P.Lexer(text, offset).tokenize())
+    parser.symbol_table['global'].update(global_symbols)
+    parser.scope_counter = scope_counter
+    return parser.parse(), parser.diagnostics, parser.symbol_table, parser.scope_counter, parser.scope_tree
+
+
+def parse_encoded_chunk(text, offset, global_symbols, scope_counter):
+    """Worker: parse_chunk with the Block's statements flattened by encode_statements for the trip back."""
+    block, *rest = parse_chunk(text, offset, global_symbols, scope_counter)
+    encoded = DecodedBlock([encode_statements(block.statements)])
+    encoded.start, encoded.end = block.start, block.end
+    return (encoded, *rest)
+
+
+class ParallelParser(P.DiagnosticLog):
+    """
+    Parses one large source file by splitting it at top-level statement boundaries
+    and parsing the chunks in worker processes. Every chunk is seeded with the global
+    declarations that precede it and with the number of scopes opened before it, so
+    `messages`, `symbol_table` and the returned Block match a sequential parse.
+    Workers send their statements back flat (encode_statements) and the returned Block
+    only rebuilds the nodes when its statements are first read, so `messages` and
+    `symbol_table` are ready once the slowest chunk is parsed. That needs a core per
+    worker: on a single core the chunks just take turns and the parse is slower than a
+    sequential one. Smaller files are parsed in-process as a single chunk.
+    """
+    def __init__(self, code, workers=None, min_chunk_size=1 << 20):
+        self.code = code
+        self.workers = workers or os.cpu_count() or 1
+        self.min_chunk_size = min_chunk_size
+        self.symbol_table = {'global': {}}
+        self.scope_counter = 0
+        self.scope_tree = Scopes.ScopeTree(self.symbol_table['global'])
+        self.reset_diagnostics()
+
+    def chunks(self):
+        """Yields (start, end, global_symbols, scope_counter) for every chunk, in order."""
+        starts, declarations = scan_top_level(self.code)
+        target = max(self.min_chunk_size, len(self.code) // (self.workers * 4) + 1)
+        cuts = [(0, 0)]
+        for offset, braces in starts:
+            if offset - cuts[-1][0] >= target:
+                cuts.append((offset, braces))
+
+        global_symbols = {}
+        next_decl = 0
+        for i, (start, braces) in enumerate(cuts):
+            end = cuts[i + 1][0] if i + 1 < len(cuts) else len(self.code)
+            # the first declaration of a name wins, exactly like checkVarDeclared/add_variable
+            while next_decl < len(declarations) and declarations[next_decl][0] < start:
+                _, name, var_type = declarations[next_decl]
+                global_symbols.setdefault(name, var_type)
+                next_decl += 1
+            yield start, end, dict(global_symbols), braces
+
+    def parse(self):
+        chunks = [(0, len(self.code), {}, 0)] if self.workers == 1 else list(self.chunks())
+        if len(chunks) == 1:
+            results = [parse_chunk(self.code, 0, {}, 0)]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(parse_encoded_chunk, self.code[start:end], start, symbols, braces)
+                           for start, end, symbols, braces in chunks]
+                # result() re-raises a chunk's error; checking in order reports the first one, as a sequential parse would
+                results = [future.result() for future in futures]
+
+        blocks = []
+        for block, diagnostics, symbol_table, scope_counter, scope_tree in results:
+            blocks.append(block)
+            # chunks are lexed with their offset, so spans are already relative to the whole file
+            self.diagnostics.extend(diagnostics)
+            # the last chunk's global table already holds every global in declaration order
+            self.symbol_table.update(symbol_table)
+            self.scope_counter = scope_counter
+            self.scope_tree.adopt(scope_tree)
+        self.scope_tree.root.symbols = self.symbol_table['global']
+        if len(blocks) == 1:
+            return blocks[0]
+        block = DecodedBlock([code for chunk in blocks for code in chunk.encoded])
+        block.start, block.end = blocks[0].start, blocks[-1].end
+        return block
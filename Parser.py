@@ -1,7 +1,164 @@
+import asyncio
+from bisect import bisect_right
+from heapq import heappop, heappush
+from itertools import islice
+import sys
+import time
 import ASTNodeDefs as AST
-class Lexer:
+import Scopes
+
+# Raised when input goes over one of the limits of a Budget
+class BudgetExceeded(Exception):
+    def __init__(self, limit, value):
+        super().__init__(f"Budget exceeded: {limit} = {value}")
+        self.limit = limit  # name of the Budget attribute, e.g. 'max_depth'
+        self.value = value
+
+# Resource limits for running the Lexer and Parser on untrusted code; None means unlimited.
+# Token, node and time limits are checked every `check_interval` tokens so the hot loops only
+# compare one counter; depth and message limits are checked exactly.
+# A Budget's clock starts on first use, so use a fresh one per input.
+class Budget:
+    def __init__(self, max_source_bytes=None, max_tokens=None, max_depth=None, max_nodes=None,
+                 max_messages=None, max_seconds=None, check_interval=256):
+        self.max_source_bytes = max_source_bytes
+        self.max_tokens = max_tokens
+        self.max_depth = max_depth if max_depth is not None else sys.maxsize
+        self.max_nodes = max_nodes
+        self.max_messages = max_messages if max_messages is not None else sys.maxsize
+        self.max_seconds = max_seconds
+        self.check_interval = check_interval
+        self.deadline = None
+
+    def start(self):
+        if self.deadline is None and self.max_seconds is not None:
+            self.deadline = time.monotonic() + self.max_seconds
+
+    def check_source(self, text, already=0):
+        """Checks the size of `text` plus `already` bytes seen before it; returns the new total."""
+        size = already + (len(text) if text.isascii() else len(text.encode('utf-8')))
+        if self.max_source_bytes is not None and size > self.max_source_bytes:
+            raise BudgetExceeded('max_source_bytes', self.max_source_bytes)
+        return size
+
+    def checkpoint(self, tokens, nodes=0):
+        """Checks the token, node and time limits; returns the token count at which to check again."""
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            raise BudgetExceeded('max_tokens', self.max_tokens)
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            raise BudgetExceeded('max_nodes', self.max_nodes)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded('max_seconds', self.max_seconds)
+        next_check = tokens + self.check_interval
+        if self.max_tokens is not None:
+            next_check = min(next_check, self.max_tokens + 1)
+        return next_check
+
+# Python frames one nesting level takes: block_steps -> while_stmt_steps -> scoped_block_steps,
+# or factor -> expression -> term for parentheses; one to spare
+FRAMES_PER_LEVEL = 4
+# frames left for the innermost statement and expression below the deepest level
+FRAME_RESERVE = 100
+
+def stack_allowance():
+    """Nesting levels that still fit under the interpreter's recursion limit, seen from the caller."""
+    frame = sys._getframe(1)
+    used = 0
+    while frame is not None:
+        used += 1
+        frame = frame.f_back
+    return max(0, (sys.getrecursionlimit() - used - FRAME_RESERVE) // FRAMES_PER_LEVEL)
+
+# Diagnostic codes and the text they format to
+MESSAGE_FORMATS = {
+    'redeclared': "Variable {} has already been declared in the current scope",
+    'undeclared': "Variable {} has not been declared in the current or any enclosing scopes",
+    'type_mismatch': "Type Mismatch between {} and {}",
+    'message': "{}",  # free-form text passed to Parser.error
+}
+
+# One problem found by the parser. The text is only built when the diagnostic is read.
+class Diagnostic:
+    __slots__ = ('code', 'args', 'start', 'end', 'position')
+
+    def __init__(self, code, args, start, end, position):
+        self.code = code
+        self.args = args
+        self.start = start  # source span of the problem
+        self.end = end
+        self.position = position  # token index at which it was reported
+
+    def __str__(self):
+        return MESSAGE_FORMATS[self.code].format(*self.args)
+
+    def __repr__(self):
+        return f"Diagnostic({self.code!r}, {self.args!r}, {self.start}, {self.end})"
+
+# Diagnostic records and the message views over them, shared by Parser and ParallelParser.
+# `messages` is a real list, filled from `diagnostics` when it is read; it can be appended to
+# or replaced like the plain list it used to be.
+class DiagnosticLog:
+    def reset_diagnostics(self):
+        self.diagnostics = []
+        self.message_list = []  # backs `messages`
+        self.formatted = 0  # diagnostics already formatted into message_list
+
+    # Problems found so far as text, in the same form the parser has always produced
+    @property
+    def messages(self):
+        if self.formatted < len(self.diagnostics):
+            self.message_list.extend(str(diagnostic) for diagnostic in self.diagnostics[self.formatted:])
+            self.formatted = len(self.diagnostics)
+        return self.message_list
+
+    @messages.setter
+    def messages(self, messages):
+        # whatever was reported before counts as handed over
+        self.message_list = messages
+        self.formatted = len(self.diagnostics)
+
+    # (start, end) source offsets of each diagnostic
+    @property
+    def message_spans(self):
+        return [(diagnostic.start, diagnostic.end) for diagnostic in self.diagnostics]
+
+    # Messages prefixed with "line:column: ", positions are only resolved here
+    def located_messages(self, lines):
+        located = []
+        for diagnostic in self.diagnostics:
+            line, column = lines.line_col(diagnostic.start)
+            located.append(f"{line}:{column}: {diagnostic}")
+        return located
+
+# Turns source offsets into 1-based (line, column) pairs.
+# The line-start table is only built the first time a position is looked up.
+class LineIndex:
     def __init__(self, code):
         self.code = code
+        self.line_starts = None
+
+    def build(self):
+        starts = [0]
+        find = self.code.find
+        newline = find('\n')
+        while newline != -1:
+            starts.append(newline + 1)
+            newline = find('\n', newline + 1)
+        self.line_starts = starts
+
+    def line_col(self, offset):
+        if self.line_starts is None:
+            self.build()
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+class Lexer:
+    def __init__(self, code, offset=0, budget=None):
+        self.budget = budget if budget is not None else Budget()
+        self.budget.start()
+        self.budget.check_source(code)
+        self.code = code
+        self.offset = offset  # position of `code` inside the whole source (non-zero when lexing a chunk)
         self.position = 0
         self.current_char = self.code[self.position]
         self.tokens = []
@@ -53,7 +210,7 @@ class Lexer:
 
             # this will make sure there are digits following the dot for a valid float
             if not post_number_digit:
-                raise ValueError(f"Invalid float format at position {self.position}")
+                raise ValueError(f"Invalid float format at position {self.offset + self.position}")
 
             result = result + post_number_digit  # add post-decimal digits to the result
 
@@ -62,7 +219,14 @@ class Lexer:
         else:
             return ('NUMBER', int(result))
         
+    # Return the next token as (type, value, start, end); start/end are offsets into the whole source.
     def token(self):
+        self.skip_whitespace()
+        start = self.offset + self.position
+        kind, value = self.scan()
+        return (kind, value, start, self.offset + self.position)
+
+    def scan(self):
         while self.current_char is not None:
             if self.current_char.isspace():
                 self.skip_whitespace()
@@ -136,37 +300,140 @@ class Lexer:
                 self.advance()
                 continue
 
-            raise ValueError(f"Illegal character at position {self.position}: {self.current_char}")
+            raise ValueError(f"Illegal character at position {self.offset + self.position}: {self.current_char}")
 
         return ('EOF', None)
 
-    # Collect all the tokens in a list.
-    def tokenize(self):
+    # Produce the tokens one at a time, ending with EOF.
+    def iter_tokens(self):
+        count = 0
+        next_check = self.budget.checkpoint(0)
         while True:
             token = self.token()
-            self.tokens.append(token)
+            count += 1
+            if count >= next_check:
+                next_check = self.budget.checkpoint(count)
+            yield token
             if token[0] == 'EOF':
                 break
+
+    # Collect all the tokens in a list.
+    def tokenize(self):
+        self.tokens.extend(self.iter_tokens())
         return self.tokens
 
+# Lazily tokenize source given as lines (e.g. an open file), so the whole text is never in memory.
+# No token spans a newline, so each line is lexed on its own; offsets are still file-wide.
+def tokenize_lines(lines, budget=None):
+    budget = budget if budget is not None else Budget()
+    offset = 0
+    size = 0
+    for line in lines:
+        if line:
+            size = budget.check_source(line, size)
+            # each line's lexer only checks time; the parser enforces the token limit for the whole stream
+            for token in Lexer(line, offset, budget).iter_tokens():
+                if token[0] != 'EOF':
+                    yield token
+        offset += len(line)
+    yield ('EOF', None, offset, offset)
+
+# Number of a symbol_table scope name: 'global' -> 0, 'scope_N' -> N
+def scope_number(scope):
+    return 0 if scope == 'global' else int(scope[len('scope_'):])
+
 import ASTNodeDefs as AST
 
-class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
-        self.current_token = tokens.pop(0)
+class Parser(DiagnosticLog):
+    def __init__(self, tokens, factory=None, lazy=False, budget=None, max_errors=None, dedupe_undeclared=False):
+        if lazy and (max_errors is not None or dedupe_undeclared):
+            # both depend on the order problems are found in, and lazy mode finds them in the order blocks are forced
+            raise ValueError("max_errors and dedupe_undeclared cannot be used with lazy=True")
+        self.budget = budget if budget is not None else Budget()
+        self.budget.start()
+        self.next_check = self.budget.checkpoint(0)
+        self.depth = 0  # current nesting of blocks and parentheses
+        self.depth_limit = self.budget.max_depth  # lowered to what the Python stack allows, see enter_nesting
+        self.statement_nodes = 0  # nodes built outside the factory
+        # Lazy mode records if/while bodies as token ranges and parses them on first access
+        self.lazy = lazy
+        if lazy:
+            self.token_list = list(tokens)
+            self.brace_match = self.match_braces()
+            self.pending_blocks = []
+            tokens = self.token_list
+        # tokens can be a list or any iterator (see Lexer.iter_tokens / tokenize_lines); one token of lookahead is kept
+        self.tokens = iter(tokens)
+        # Expression nodes are built through the factory; pass AST.HashConsFactory() to share duplicate subtrees
+        self.factory = factory if factory is not None else AST.NodeFactory()
+        self.current_token = next(self.tokens)
+        self.lookahead = next(self.tokens, None)
+        self.pos = 0  # index of current_token in the token stream
         # Use these to track the variables and their scope
         self.symbol_table = {'global': {}}
         self.scope_counter = 0
         self.scope_stack = ['global']
-        self.messages = []
+        self.retain_scopes = True  # False drops a nested scope's symbols once it is closed
+        # Scopes with their source ranges, kept after parsing for position queries (see Scopes.ScopeTree)
+        self.scope_tree = Scopes.ScopeTree(self.symbol_table['global'])
+        self.reset_diagnostics()  # Diagnostic records; `messages` formats them on demand
+        self.message_count = 0  # total reported, including messages already handed out by iter_statements
+        # after max_errors problems nothing more is reported; types are still resolved and parsing carries on
+        self.max_errors = max_errors if max_errors is not None else sys.maxsize
+        self.checking = True
+        # report each undeclared name once instead of at every use
+        self.dedupe_undeclared = dedupe_undeclared
+        self.reported_undeclared = set()
+        self.suppressed = 0  # repeats left out by dedupe_undeclared
+        self.prev_end = 0  # end offset of the last consumed token
+        self.next_pause = sys.maxsize  # token position where parse_async next yields to the event loop
+
+    # Record a problem by diagnostic code; the span defaults to the current token
+    def report(self, code, args, start=None, end=None):
+        self.message_count += 1
+        if self.message_count > self.budget.max_messages:
+            raise BudgetExceeded('max_messages', self.budget.max_messages)
+        if self.message_count >= self.max_errors:
+            self.checking = False
+        if start is None:
+            start, end = self.current_token[2], self.current_token[3]
+        self.diagnostics.append(Diagnostic(code, args, start, end, self.pos))
+
+    def error(self, message, start=None, end=None):
+        self.report('message', (message,), start, end)
 
-    def error(self, message):
-        self.messages.append(message)
-    
     def advance(self):
-        if self.tokens:
-            self.current_token = self.tokens.pop(0)
+        if self.lookahead is not None:
+            self.prev_end = self.current_token[3]
+            self.current_token = self.lookahead
+            self.lookahead = next(self.tokens, None)
+            self.pos += 1
+            # pos is an index and next_check a token count
+            if self.pos + 1 >= self.next_check:
+                self.next_check = self.budget.checkpoint(self.pos + 1, self.factory.created + self.statement_nodes)
+
+    # Track block/parenthesis nesting so deep input fails with BudgetExceeded instead of RecursionError.
+    # max_depth is capped by the recursion limit, measured each time an outermost level is entered.
+    def enter_nesting(self):
+        if self.depth == 0:
+            self.depth_limit = min(self.budget.max_depth, stack_allowance())
+        self.depth += 1
+        if self.depth > self.depth_limit:
+            raise BudgetExceeded('max_depth', self.depth_limit)
+
+    def exit_nesting(self):
+        self.depth -= 1
+
+    # Set the source span of a statement node that began at `start` and ends at the last consumed token
+    def span(self, node, start):
+        self.statement_nodes += 1
+        node.start = start
+        # an empty program starts at EOF, after the last consumed token
+        node.end = self.prev_end if self.prev_end > start else start
+        if not self.lazy:
+            # bottom-up, so only this node is hashed; in lazy mode it would force the bodies
+            node._digest = node.compute_digest()
+        return node
 
     # TODO: Implement logic to enter a new scope, add it to symbol table, and update `scope_stack`
     def enter_scope(self):
@@ -175,6 +442,10 @@ class Parser:
         unique_named_scope = f'scope_{self.scope_counter}'
         # this will set an additional scope in the symbol table
         self.symbol_table[unique_named_scope] = {}
+        if self.retain_scopes:
+            # called just after the '{' is consumed
+            parent = self.scope_tree.by_name[self.current_scope()]
+            self.scope_tree.add(Scopes.Scope(unique_named_scope, parent, self.symbol_table[unique_named_scope], self.prev_end - 1))
         self.scope_stack.append(unique_named_scope)
 
     # TODO: Implement logic to exit the current scope, removing it from `scope_stack`
@@ -182,6 +453,11 @@ class Parser:
         # get rid of the present scope from stack
         current_scope = self.scope_stack.pop()
         # alternatively, delete the scope from the symbol table if it is no longer required
+        if not self.retain_scopes:
+            del self.symbol_table[current_scope]
+        else:
+            # called just after the '}' is consumed
+            self.scope_tree.by_name[current_scope].end = self.prev_end
 
     # Return the current scope name
     def current_scope(self):
@@ -193,9 +469,9 @@ class Parser:
         current_scope = self.current_scope()
         # check variable declaration
         check_declaration = identifier in self.symbol_table[current_scope]
-        if check_declaration:
+        if check_declaration and self.checking:
             # error if the variable is already declared and defined
-            self.error(f"Variable {identifier} has already been declared in the current scope")
+            self.report('redeclared', (identifier,))
         return check_declaration
 
     # TODO: Check if a variable is declared in any accessible scope; if not, log an error
@@ -203,19 +479,28 @@ class Parser:
         # obtain the type for the variable from the symbol table
         var_type = self.get_variable_type(identifier)
         if var_type is None:
+            if not self.checking:
+                # past max_errors: nothing more is reported, but types are still resolved
+                return False
             # error if not defined in some accessible/ready scope
-            self.error(f"Variable {identifier} has not been declared in the current or any enclosing scopes")
+            if self.dedupe_undeclared and identifier in self.reported_undeclared:
+                self.suppressed += 1
+                return False
+            self.reported_undeclared.add(identifier)
+            self.report('undeclared', (identifier,))
             return False
         # true if declared/defined
         return True
 
     # TODO: Check type mismatch between two entities; log an error if they do not match
-    def checkTypeMatch2(self, vType, eType, var, exp):
-        if vType is None or eType is None:
+    def checkTypeMatch2(self, vType, eType, start, end):
+        if vType is None or eType is None or not self.checking:
             # if statement to return false if types are not known
             return False
         if vType != eType:
-            self.error(f"Type Mismatch between {vType} and {eType}")
+            # [start, end) covers both operands, or the assigned expression; taken from token offsets
+            # because a hash-consed node can be shared by several places in the source
+            self.report('type_mismatch', (vType, eType), start, end)
             return False #if there is a type mismatch, this if statement will then return false, if a match is found then return true
         return True
 
@@ -223,6 +508,9 @@ class Parser:
     def add_variable(self, name, var_type):
         current_scope = self.current_scope() #find the current scope
         self.symbol_table[current_scope][name] = var_type #increment symbol table with the respective variable for the current scope
+        if current_scope in self.scope_tree.by_name:
+            # the identifier is still the current token
+            self.scope_tree.by_name[current_scope].declared_at[name] = self.current_token[2]
         count_scope = len(self.symbol_table[current_scope]) #track variable count within scope (used to debug if there's an error)
 
     # TODO: Retrieve the variable type from `symbol_table` if it exists
@@ -238,11 +526,52 @@ class Parser:
     def parse(self):
         return self.program()
 
-    def program(self):
-        statements = []
+    def iter_statements(self):
+        """
+        Streaming alternative to parse(): yields (statement, diagnostics) for each top-level
+        statement as soon as it is parsed, where diagnostics are the Diagnostic records that
+        statement produced (str() gives the message, start/end the span).
+        Nothing is accumulated: diagnostics are handed over, closed scopes are dropped from
+        `symbol_table` and only the global symbols are kept, so with a lazy token source
+        (tokenize_lines) memory stays bounded by the largest top-level statement.
+        """
+        if self.lazy:
+            # dropping closed scopes would lose the ones deferred bodies are checked against
+            raise ValueError("iter_statements cannot be used with lazy=True")
+        self.retain_scopes = False
         while self.current_token[0] != 'EOF':
-            statements.append(self.statement())
-        return AST.Block(statements)
+            statement = self.statement()
+            diagnostics = self.diagnostics
+            self.reset_diagnostics()
+            yield statement, diagnostics
+
+    async def parse_async(self, slice_size=1024):
+        """
+        Same result as parse(), but awaits once `slice_size` tokens have been consumed since
+        the last pause, checked after every statement at any depth, so other tasks on the
+        event loop keep running; a single statement that is not an if/while is never split.
+        Cancelling the task stops the parse at the next pause; the parser is not reusable afterwards.
+        """
+        steps = self.block_steps('EOF')
+        self.next_pause = self.pos + slice_size
+        while True:
+            try:
+                next(steps)
+            except StopIteration as finished:
+                return finished.value
+            await asyncio.sleep(0)
+            self.next_pause = self.pos + slice_size
+
+    # Run one of the *_steps generators to the end; outside parse_async next_pause is never reached
+    def run(self, steps):
+        try:
+            while True:
+                next(steps)
+        except StopIteration as finished:
+            return finished.value
+
+    def program(self):
+        return self.run(self.block_steps('EOF'))
 
     # TODO: Modify the `statement` function to dispatch to declare statement
     def statement(self):
@@ -252,9 +581,9 @@ class Parser:
         
         # originally check these control flow statements
         elif self.current_token[0] == 'IF':
-            return self.if_stmt()
+            return self.run(self.if_stmt_steps())
         elif self.current_token[0] == 'WHILE':
-            return self.while_stmt()
+            return self.run(self.while_stmt_steps())
 
         # this will handle statements that are identifier-based
         elif self.current_token[0] == 'IDENTIFIER':
@@ -264,11 +593,11 @@ class Parser:
                 return self.function_call()
             else:
                 # raising an error for an incorrect token following an identifier
-                raise ValueError(f"Unexpected token after identifier: {self.current_token}")
+                raise ValueError(f"Unexpected token after identifier: {self.current_token[:2]}")
 
         # if any other unexpected tokens are encountered, raise an error
         else:
-            raise ValueError(f"Unexpected token: {self.current_token}")
+            raise ValueError(f"Unexpected token: {self.current_token[:2]}")
 
     # TODO: Implement the declaration statement and handle adding the variable to the symbol table
     def decl_stmt(self):
@@ -279,6 +608,7 @@ class Parser:
         float y = 3.5
         TODO: Implement logic to parse type, identifier, and initialization expression and also handle type checking
         """
+        start = self.current_token[2]
         # check var type either int or float
         var_type = self.current_token[1]  # this will extract the respective type
         self.advance()  # advance to next token
@@ -286,6 +616,7 @@ class Parser:
         # varify the next token is an identifier 
         if self.current_token[0] == 'IDENTIFIER':  # check validity
             var_name = self.current_token[1]  # extract similar to above, if an issue is found, raise an error
+            name_start = self.current_token[2]
         else:
             raise ValueError(f"Expected IDENTIFIER after type, got {self.current_token[0]}")
 
@@ -301,15 +632,18 @@ class Parser:
             raise ValueError(f"Expected '=', got {self.current_token[0]}")
 
         # evaluate the starting statement
+        expression_start = self.current_token[2]
         expression = self.expression()  
 
         # checking type compatability
         exp_type = expression.value_type  
         if exp_type is not None:  
-            self.checkTypeMatch2(var_type, exp_type, var_name, expression)
+            self.checkTypeMatch2(var_type, exp_type, expression_start, self.prev_end)
 
         # finally give the AST node for the definition.
-        return AST.Declaration(var_type, var_name, expression)
+        declaration = AST.Declaration(var_type, var_name, expression)
+        declaration.name_start = name_start
+        return self.span(declaration, start)
 
     # TODO: Parse assignment statements, handle type checking
     def assign_stmt(self):
@@ -320,6 +654,7 @@ class Parser:
         x = y + 5
         TODO: Implement logic to handle assignment, including type checking.
         """
+        start = self.current_token[2]
         # as the prior process, this time parse identifier and extract var name
         var_name = self.current_token[1]  
 
@@ -336,17 +671,19 @@ class Parser:
         else:
             raise ValueError(f"Expected '=', got {self.current_token[0]}")
 
+        expression_start = self.current_token[2]
         expression = self.expression()  
 
         # checking for compatability checks
         if var_type is not None and expression.value_type is not None:  
-            self.checkTypeMatch2(var_type, expression.value_type, var_name, expression)
+            self.checkTypeMatch2(var_type, expression.value_type, expression_start, self.prev_end)
 
         # finally return the AST node 
-        return AST.Assignment(var_name, expression)
+        return self.span(AST.Assignment(var_name, expression), start)
 
     # TODO: Implement the logic to parse the if condition and blocks of code
-    def if_stmt(self):
+    # if/while/block parsing is written as generators that yield where parse_async may pause
+    def if_stmt_steps(self):
         """
         Parses an if-statement, with an optional else block.
         Example:
@@ -358,6 +695,7 @@ class Parser:
         }
         TODO: Implement the logic to parse the if condition and blocks of code.
         """
+        start = self.current_token[2]
         # advance pass if
         self.advance()  
 
@@ -365,37 +703,28 @@ class Parser:
         condition = self.boolean_expression()  
 
         # check that { indicates the start of the then block and corresponding statements
-        if self.current_token[0] == 'LBRACE':  
-            self.advance()  
-        else:
+        if self.current_token[0] != 'LBRACE':
             raise ValueError(f"Expected '{{', got {self.current_token[0]}")
 
-        # enter the new scope
-        self.enter_scope()
-        # iterate through then block conditions
-        then_block = self.block()
-        self.exit_scope()
+        # iterate through then block conditions in a new scope
+        then_block = yield from self.scoped_block_steps()
 
         # this will check for else block (optional block)
         else_block = None
         if self.current_token[0] == 'ELSE': 
             self.advance() 
             # similar to above, statement to check { marks beginning
-            if self.current_token[0] == 'LBRACE':  
-                self.advance()  
-            else:
+            if self.current_token[0] != 'LBRACE':
                 raise ValueError(f"Expected '{{' after 'else', got {self.current_token[0]}")
 
             # similar process as above here
-            self.enter_scope()
-            else_block = self.block()
-            self.exit_scope()
+            else_block = yield from self.scoped_block_steps()
 
         # lastly return AST statement 
-        return AST.IfStatement(condition, then_block, else_block)
+        return self.span(AST.IfStatement(condition, then_block, else_block), start)
 
     # TODO: Implement the logic to parse while loops with a condition and a block of statements
-    def while_stmt(self):
+    def while_stmt_steps(self):
         """
         Parses a while-statement.
         Example:
@@ -404,6 +733,7 @@ class Parser:
         }
         TODO: Implement the logic to parse while loops with a condition and a block of statements.
         """
+        start = self.current_token[2]
         # advance pass while, similar procedure as above
         self.advance() 
 
@@ -411,25 +741,118 @@ class Parser:
         condition = self.boolean_expression()  
 
         # check { indicates start of block
-        if self.current_token[0] == 'LBRACE':  
-            self.advance()  
-        else:
+        if self.current_token[0] != 'LBRACE':
             raise ValueError(f"Expected '{{', got {self.current_token[0]}")
 
-        self.enter_scope()
-        # set an id to track scope counter if there is an error (easier to debug)
-        check_loop = f"loop_{self.scope_counter}" 
         # parse block expressions
-        block = self.block()
-        self.exit_scope()
+        block = yield from self.scoped_block_steps()
 
         # return final AST
-        return AST.WhileStatement(condition, block)
+        return self.span(AST.WhileStatement(condition, block), start)
+
+    # Parse the '{' block at the current token in a new scope; in lazy mode it is only recorded
+    def scoped_block_steps(self):
+        if self.lazy and self.pos in self.brace_match:
+            return self.defer_block()
+        self.enter_nesting()
+        self.advance()
+        self.enter_scope()
+        block = yield from self.block_steps()
+        self.exit_scope()
+        self.exit_nesting()
+        return block
+
+    # Lazy mode: skip to the matching '}' and return a LazyBlock remembering the visible scopes.
+    # Symbol dicts only ever grow, so a scope is captured by its name and current size.
+    def defer_block(self):
+        open_index = self.pos
+        close_index, scope_number, scopes_through_close = self.brace_match[open_index]
+        snapshot = [(scope, len(self.symbol_table[scope])) for scope in self.scope_stack]
+        block = AST.LazyBlock(self, open_index, scope_number, self.depth, snapshot)
+        block.start = self.current_token[2]
+        block.end = self.token_list[close_index][3]
+        heappush(self.pending_blocks, (scope_number, block))
+        # the skipped braces still count, so the scopes after this block get their usual names
+        self.scope_counter = scopes_through_close
+        self.seek(close_index + 1)
+        return block
+
+    # Parse a deferred block now, as if the parser were back where it was recorded
+    def force_block(self, lazy):
+        saved = (self.tokens, self.current_token, self.lookahead, self.pos, self.prev_end,
+                 self.scope_stack, self.scope_counter, self.symbol_table,
+                 self.diagnostics, self.message_list, self.formatted, self.depth, self.depth_limit)
+        symbol_table = self.symbol_table
+        self.symbol_table = {scope: dict(islice(symbol_table[scope].items(), size)) for scope, size in lazy.snapshot}
+        self.scope_stack = [scope for scope, _ in lazy.snapshot]
+        self.scope_counter = lazy.scope_number - 1
+        self.reset_diagnostics()
+        # the levels around the block still count; the Python stack below this call is a new one
+        self.depth = lazy.depth
+        self.depth_limit = min(self.budget.max_depth, lazy.depth + stack_allowance())
+        try:
+            self.seek(lazy.open_index)
+            self.enter_nesting()
+            self.advance()
+            self.enter_scope()
+            block = self.run(self.block_steps())
+            self.exit_scope()
+            self.exit_nesting()
+            forced = self.diagnostics
+            scopes = self.symbol_table
+        finally:
+            (self.tokens, self.current_token, self.lookahead, self.pos, self.prev_end,
+             self.scope_stack, self.scope_counter, self.symbol_table,
+             self.diagnostics, self.message_list, self.formatted, self.depth, self.depth_limit) = saved
+        new = [(scope, names) for scope, names in scopes.items() if scope not in symbol_table]
+        if new and scope_number(next(reversed(symbol_table))) > scope_number(new[0][0]):
+            # forced ahead of an earlier block: reinsert so the scopes stay in scope-number order
+            merged = sorted([*symbol_table.items(), *new], key=lambda item: scope_number(item[0]))
+            symbol_table.clear()
+            symbol_table.update(merged)
+        else:
+            symbol_table.update(new)
+        # splice the block's messages in where a sequential parse would have produced them
+        at = bisect_right(self.diagnostics, lazy.open_index, key=lambda diagnostic: diagnostic.position)
+        self.diagnostics[at:at] = forced
+        if at <= self.formatted:
+            # `messages` was already read up to this point; keep it in step
+            self.message_list[at:at] = map(str, forced)
+            self.formatted += len(forced)
+        return block
+
+    # Lazy mode: parse every deferred block, after which messages match an eager parse.
+    # Blocks go in scope-number order, so each one's scopes are appended to symbol_table.
+    def force_all(self):
+        while self.pending_blocks:
+            heappop(self.pending_blocks)[1].statements
+
+    def seek(self, index):
+        self.pos = index
+        self.prev_end = self.token_list[index - 1][3] if index else 0
+        self.current_token = self.token_list[index]
+        self.tokens = map(self.token_list.__getitem__, range(index + 1, len(self.token_list)))
+        self.lookahead = next(self.tokens, None)
+
+    # One pass over the tokens: '{' index -> (matching '}' index, its scope number, scopes opened up to the '}')
+    def match_braces(self):
+        matches = {}
+        open_braces = []
+        opened = 0
+        for index, token in enumerate(self.token_list):
+            if token[0] == 'LBRACE':
+                opened += 1
+                open_braces.append((index, opened))
+            elif token[0] == 'RBRACE' and open_braces:
+                open_index, scope_number = open_braces.pop()
+                matches[open_index] = (index, scope_number, opened)
+        return matches
 
     # TODO: Implement logic to capture multiple statements as part of a block
-    def block(self):
+    def block_steps(self, end='RBRACE'):
         """
         Parses a block of statements. A block is a collection of statements grouped by `{}`.
+        With end='EOF' it parses the whole program instead.
         Example:
         
         x = 5
@@ -437,13 +860,24 @@ class Parser:
         
         TODO: Implement logic to capture multiple statements as part of a block.
         """
+        # include the '{' consumed by the caller
+        start = self.prev_end - 1 if end == 'RBRACE' else self.current_token[2]
         # define a list to hold block statements and expressions
         statements = []
         # parse till } is found
-        while self.current_token[0] != 'RBRACE':
-            statements.append(self.statement())  # iterate and parse, append to statements
-        self.advance()
-        return AST.Block(statements)
+        while self.current_token[0] != end:
+            # if/while go through their generators so a pause can happen inside their bodies
+            if self.current_token[0] == 'IF':
+                statements.append((yield from self.if_stmt_steps()))
+            elif self.current_token[0] == 'WHILE':
+                statements.append((yield from self.while_stmt_steps()))
+            else:
+                statements.append(self.statement())  # iterate and parse, append to statements
+            if self.pos >= self.next_pause:
+                yield
+        if end == 'RBRACE':
+            self.advance()
+        return self.span(AST.Block(statements), start)
 
     # TODO: Implement logic to parse binary operations (e.g., addition, subtraction) with correct precedence and type checking
     def expression(self):
@@ -453,6 +887,7 @@ class Parser:
         x + y - 5
         TODO: Implement logic to parse binary operations (e.g., addition, subtraction) with correct precedence and type checking.
         """
+        start = self.current_token[2]
         # parse through left side operand
         left = self.term()
 
@@ -464,9 +899,9 @@ class Parser:
             # traverse right side operand
             right = self.term()
             # check operand type, then compatability
-            self.checkTypeMatch2(left.value_type, right.value_type, left, right)
+            self.checkTypeMatch2(left.value_type, right.value_type, start, self.prev_end)
             # It is expected that the resulting type matches the type of the left operand.
-            left = AST.BinaryOperation(left, op, right, value_type = left.value_type)
+            left = self.factory.binary_operation(left, op, right, left.value_type, start, self.prev_end)
 
         return left
 
@@ -478,6 +913,7 @@ class Parser:
         x == 5
         TODO: Implement parsing for boolean expressions and check for type compatibility.
         """
+        start = self.current_token[2]
         # as above, traverse left side operand
         left = self.expression()
 
@@ -489,8 +925,8 @@ class Parser:
             right = self.expression()
             # check for compatability only if the types are none for left.value_type and right.value_type
             if left.value_type is not None and right.value_type is not None:
-                self.checkTypeMatch2(left.value_type, right.value_type, left, right)
-            return AST.BooleanExpression(left, op, right)
+                self.checkTypeMatch2(left.value_type, right.value_type, start, self.prev_end)
+            return self.factory.boolean_expression(left, op, right, start, self.prev_end)
 
         else:
             # error raised if proper comparasion operator not found
@@ -505,6 +941,7 @@ class Parser:
         x * y / z
         TODO: Implement parsing for multiplication and division and check for type compatibility.
         """
+        start = self.current_token[2]
         # as above, traverse left side operand
         left = self.factor()
         # valid operators set as multiply and divide
@@ -516,25 +953,26 @@ class Parser:
             right = self.factor()
             # checking for compatability if types are not None and known
             if left.value_type is not None and right.value_type is not None:
-                self.checkTypeMatch2(left.value_type, right.value_type, left, right)
+                self.checkTypeMatch2(left.value_type, right.value_type, start, self.prev_end)
                 result_type = left.value_type  # assuming that types indeed match
             else:
                 result_type = None  
-            left = AST.BinaryOperation(left, op, right, value_type=result_type)
+            left = self.factory.binary_operation(left, op, right, result_type, start, self.prev_end)
 
         return left
         
     def factor(self):
+        start = self.current_token[2]
         if self.current_token[0] == 'NUMBER':
             # handle int
             num = self.current_token[1]
             self.advance()
-            return AST.Factor(num, 'int')
+            return self.factory.factor(num, 'int', start, self.prev_end)
         elif self.current_token[0] == 'FNUMBER':
             # handle float
             num = self.current_token[1]
             self.advance()
-            return AST.Factor(num, 'float')
+            return self.factory.factor(num, 'float', start, self.prev_end)
         
         
         elif self.current_token[0] == 'IDENTIFIER':
@@ -547,25 +985,28 @@ class Parser:
                 var_type = self.get_variable_type(var_name)  # this will acquire the variable type from the symbol table
             self.advance()  # advance past identifier
             
-            return AST.Factor(var_name, var_type)
+            return self.factory.factor(var_name, var_type, start, self.prev_end)
         
 
         elif self.current_token[0] == 'LPAREN':
+            self.enter_nesting()
             self.advance()
             expr = self.expression()
             self.expect('RPAREN')
+            self.exit_nesting()
             return expr
         else:
-            raise ValueError(f"Unexpected token in factor: {self.current_token}")
+            raise ValueError(f"Unexpected token in factor: {self.current_token[:2]}")
 
     def function_call(self):
+        start = self.current_token[2]
         func_name = self.current_token[1]
         self.advance()
         self.expect('LPAREN')
         args = self.arg_list()
         self.expect('RPAREN')
 
-        return AST.FunctionCall(func_name, args)
+        return self.span(AST.FunctionCall(func_name, args), start)
 
     def arg_list(self):
         """
@@ -589,7 +1030,14 @@ class Parser:
             raise ValueError(f"Expected token {token_type}, but got {self.current_token[0]}")
 
     def peek(self):
-        return self.tokens[0][0] if self.tokens else None
+        return self.lookahead[0] if self.lookahead is not None else None
+
+# Lex and parse `code` inside an asyncio service without blocking the event loop.
+# Tokens are produced on demand, so lexing is sliced along with parsing. Returns (ast, parser).
+async def parse_async(code, slice_size=1024, budget=None):
+    parser = Parser(Lexer(code, budget=budget).iter_tokens(), budget=budget)
+    ast = await parser.parse_async(slice_size)
+    return ast, parser
 
 
 # test cases that were implemented to briefly test, this is more brief test cases written like pseudocode
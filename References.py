@@ -0,0 +1,201 @@
+from bisect import bisect_right
+
+import ASTNodeDefs as AST
+
+# A declared name together with the Block that declares it (the program Block for globals)
+class Binding:
+    def __init__(self, name, scope, declaration, statement):
+        self.name = name
+        self.scope = scope
+        self.declaration = declaration
+        self.statement = statement  # index of the top-level statement holding the declaration
+        # top-level statement index -> [(relative offset, kind)], kind is 'declaration', 'assignment' or 'use'
+        self.occurrences = {}
+
+# Occurrences inside one top-level statement, stored relative to its start so that
+# editing an earlier statement only has to move `base`
+class StatementEntry:
+    def __init__(self, node, base):
+        self.node = node
+        self.origin = node.start  # the node's spans stay in the coordinates it was parsed in
+        self.base = base  # where the statement starts in the current source
+        self.starts = []   # sorted relative start offsets of every occurrence
+        self.ends = []
+        self.targets = []  # (binding, kind) for each occurrence
+        self.declared = []  # bindings declared in this statement
+
+class OccurrenceIndex:
+    """
+    Maps every binding to its declaration and the offsets of its uses and assignments,
+    built in one pass over a parsed program (with source spans, so not a hash-consed one).
+    Name lookups are O(1), offset lookups O(log n), and `replace_statement` re-indexes
+    only the edited top-level statement unless it changes which global it declares first.
+    """
+    def __init__(self, program):
+        self.program = program
+        self.entries = []
+        self.bases = []
+        self.bindings = {}  # (name, scope Block) -> Binding
+        self.globals = {}   # name -> Binding, first declaration wins like the parser
+        self.index_from(0)
+
+    def index_from(self, first, bases=None):
+        for i, node in enumerate(self.program.statements[first:], first):
+            entry = StatementEntry(node, bases[i - first] if bases is not None else node.start)
+            self.walk_statement(entry, i, node, [(self.program, self.globals)])
+            self.entries.append(entry)
+            self.bases.append(entry.base)
+
+    def record(self, entry, i, binding, kind, start, end):
+        entry.starts.append(start - entry.origin)
+        entry.ends.append(end - entry.origin)
+        entry.targets.append((binding, kind))
+        binding.occurrences.setdefault(i, []).append((start - entry.origin, kind))
+
+    def lookup(self, scopes, name, i):
+        for _, names in reversed(scopes):
+            binding = names.get(name)
+            if binding is not None:
+                # while a statement is replaced, `globals` also holds the declarations after it
+                return binding if binding.statement <= i else None
+        return None
+
+    def walk_expression(self, entry, i, node, scopes):
+        # an explicit stack, left operand first, so occurrences stay in source order
+        # and long operator chains do not recurse
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, AST.Factor):
+                if isinstance(node.value, str):
+                    binding = self.lookup(scopes, node.value, i)
+                    if binding is not None:
+                        self.record(entry, i, binding, 'use', node.start, node.end)
+            elif isinstance(node, (AST.BinaryOperation, AST.BooleanExpression)):
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def walk_block(self, entry, i, block, scopes):
+        scopes.append((block, {}))
+        for stmt in block.statements:
+            self.walk_statement(entry, i, stmt, scopes)
+        scopes.pop()
+
+    def walk_statement(self, entry, i, stmt, scopes):
+        if isinstance(stmt, AST.Declaration):
+            scope, names = scopes[-1]
+            binding = names.get(stmt.identifier)
+            name_end = stmt.name_start + len(stmt.identifier)
+            if binding is None or (scope is self.program and binding.statement == i):
+                if binding is None:
+                    binding = Binding(stmt.identifier, scope, stmt, i)
+                    names[stmt.identifier] = binding
+                    self.bindings[(stmt.identifier, scope)] = binding
+                else:
+                    # replace_statement kept the global this statement declares
+                    binding.declaration = stmt
+                entry.declared.append(binding)
+                self.record(entry, i, binding, 'declaration', stmt.name_start, name_end)
+            else:
+                # redeclaration in the same scope: the parser keeps the first binding
+                self.record(entry, i, binding, 'assignment', stmt.name_start, name_end)
+            if stmt.expression is not None:
+                self.walk_expression(entry, i, stmt.expression, scopes)
+        elif isinstance(stmt, AST.Assignment):
+            binding = self.lookup(scopes, stmt.identifier, i)
+            if binding is not None:
+                self.record(entry, i, binding, 'assignment', stmt.start, stmt.start + len(stmt.identifier))
+            self.walk_expression(entry, i, stmt.expression, scopes)
+        elif isinstance(stmt, AST.FunctionCall):
+            for arg in stmt.arguments:
+                self.walk_expression(entry, i, arg, scopes)
+        elif isinstance(stmt, AST.IfStatement):
+            self.walk_expression(entry, i, stmt.condition, scopes)
+            self.walk_block(entry, i, stmt.then_block, scopes)
+            if stmt.else_block is not None:
+                self.walk_block(entry, i, stmt.else_block, scopes)
+        elif isinstance(stmt, AST.WhileStatement):
+            self.walk_expression(entry, i, stmt.condition, scopes)
+            self.walk_block(entry, i, stmt.block, scopes)
+
+    def forget(self, i, keep_global=False):
+        """Drop everything statement `i` contributed, except its global binding if `keep_global`."""
+        entry = self.entries[i]
+        for binding, _ in entry.targets:
+            binding.occurrences.pop(i, None)
+        for binding in entry.declared:
+            if keep_global and binding.scope is self.program:
+                continue
+            del self.bindings[(binding.name, binding.scope)]
+            if self.globals.get(binding.name) is binding:
+                del self.globals[binding.name]
+
+    # Queries
+
+    def binding(self, name, scope=None):
+        """The binding of `name` declared directly in `scope` (a Block; the program by default)."""
+        return self.bindings.get((name, scope if scope is not None else self.program))
+
+    def at(self, offset):
+        """The (binding, kind) of the identifier occurrence covering `offset`, or None."""
+        i = bisect_right(self.bases, offset) - 1
+        if i < 0:
+            return None
+        entry = self.entries[i]
+        relative = offset - entry.base
+        k = bisect_right(entry.starts, relative) - 1
+        if k >= 0 and relative < entry.ends[k]:
+            return entry.targets[k]
+        return None
+
+    def offsets(self, binding, kinds):
+        found = []
+        for i in sorted(binding.occurrences):
+            base = self.entries[i].base
+            found.extend(base + relative for relative, kind in binding.occurrences[i] if kind in kinds)
+        return found
+
+    def uses(self, binding):
+        return self.offsets(binding, ('use',))
+
+    def assignments(self, binding):
+        return self.offsets(binding, ('declaration', 'assignment'))
+
+    # Updates
+
+    def first_declared(self, node, i):
+        """The global that `node`, as top-level statement `i`, would be the first to declare."""
+        if isinstance(node, AST.Declaration):
+            binding = self.globals.get(node.identifier)
+            if binding is None or binding.statement >= i:
+                return node.identifier
+        return None
+
+    def replace_statement(self, i, node, delta):
+        """
+        Replace top-level statement `i` with `node`, parsed from the edited source.
+        `node`'s span must be in the edited source, and `delta` is how much longer the
+        edited source is than before; the statements after it are shifted by that much.
+        """
+        old = self.entries[i]
+        declared = next((binding.name for binding in old.declared if binding.scope is self.program), None)
+        first = self.first_declared(node, i)
+        self.program.statements[i] = node
+        self.program._digest = None  # the cached structural hash described the old statement
+        if first != declared:
+            # a different first declaration changes how the statements after this one resolve
+            bases = [node.start] + [base + delta for base in self.bases[i + 1:]]
+            for j in range(len(self.entries) - 1, i - 1, -1):
+                self.forget(j)
+            del self.entries[i:]
+            del self.bases[i:]
+            self.index_from(i, bases)
+            return
+        self.forget(i, keep_global=True)
+        entry = StatementEntry(node, node.start)
+        self.walk_statement(entry, i, node, [(self.program, self.globals)])
+        self.entries[i] = entry
+        self.bases[i] = entry.base
+        for j in range(i + 1, len(self.entries)):
+            self.entries[j].base += delta
+            self.bases[j] += delta
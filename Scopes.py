@@ -0,0 +1,68 @@
+from bisect import bisect_right
+
+# One lexical scope: its source range [start, end), the enclosing scope and what it declares
+class Scope:
+    def __init__(self, name, parent, symbols, start, end=None):
+        self.name = name  # 'global' or 'scope_N', as in Parser.symbol_table
+        self.parent = parent
+        self.symbols = symbols  # name -> type; the same dict as Parser.symbol_table[name]
+        self.declared_at = {}  # name -> offset of the declared identifier
+        self.start = start
+        self.end = end  # None for the global scope, which covers the whole file
+
+    def contains(self, offset):
+        return self.start <= offset and (self.end is None or offset < self.end)
+
+# Every scope the parser opened, kept sorted by start offset. Scopes nest properly, so the
+# innermost scope around an offset is the last one starting at or before it, or an ancestor of it.
+class ScopeTree:
+    def __init__(self, global_symbols):
+        self.root = Scope('global', None, global_symbols, 0)
+        self.by_name = {'global': self.root}
+        self.starts = []
+        self.scopes = []
+
+    def add(self, scope):
+        # appending is the common case; forced lazy blocks can arrive out of order
+        at = bisect_right(self.starts, scope.start)
+        self.starts.insert(at, scope.start)
+        self.scopes.insert(at, scope)
+        self.by_name[scope.name] = scope
+
+    def adopt(self, other):
+        """Append the scopes of a tree built for a later chunk of the same file (ParallelParser)."""
+        for scope in other.scopes:
+            if scope.parent is other.root:
+                scope.parent = self.root
+            self.add(scope)
+        for name, offset in other.root.declared_at.items():
+            self.root.declared_at.setdefault(name, offset)
+
+    def scope_at(self, offset):
+        i = bisect_right(self.starts, offset) - 1
+        scope = self.scopes[i] if i >= 0 else self.root
+        # the root stands for the whole file, including offsets outside it
+        while scope is not self.root and not scope.contains(offset):
+            scope = scope.parent
+        return scope
+
+    def lookup(self, name, offset):
+        """Type of `name` as seen at `offset`, or None if it is not visible there."""
+        scope = self.scope_at(offset)
+        while scope is not None:
+            declared = scope.declared_at.get(name)
+            if declared is not None and declared <= offset:
+                return scope.symbols[name]
+            scope = scope.parent
+        return None
+
+    def visible_at(self, offset):
+        """Every variable visible at `offset` mapped to its type; inner declarations shadow outer ones."""
+        visible = {}
+        scope = self.scope_at(offset)
+        while scope is not None:
+            for name, declared in scope.declared_at.items():
+                if declared <= offset and name not in visible:
+                    visible[name] = scope.symbols[name]
+            scope = scope.parent
+        return visible
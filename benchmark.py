@@ -0,0 +1,151 @@
+import asyncio
+import os
+import sys
+import time
+
+import Parser as p0
+import Dataflow
+import Diff
+import ParallelParser
+
+# Builds `depth` nested while loops, each level declaring and updating a few variables
+def loop_nest(depth, width=4):
+    lines = []
+    for level in range(depth):
+        indent = "  " * level
+        lines.append(f"{indent}int i{level} = 0")
+        for k in range(width):
+            lines.append(f"{indent}int v{level}_{k} = i{level} + {k}")
+        lines.append(f"{indent}while i{level} < 10 {{")
+        for k in range(width):
+            lines.append(f"{indent}  v{level}_{k} = v{level}_{k} + i{level}")
+        lines.append(f"{indent}  i{level} = i{level} + 1")
+    for level in reversed(range(depth)):
+        lines.append("  " * level + "}")
+    return "\n".join(lines)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def parse(code):
+    return p0.Parser(p0.Lexer(code).tokenize()).parse()
+
+def analyze(ast):
+    return Dataflow.DataflowAnalysis(ast).analyze()
+
+# Dataflow analysis time against parse time as loop nests get deeper
+def bench_dataflow():
+    print("depth  statements  parse(s)  dataflow(s)")
+    for depth in (10, 25, 50, 100, 200):
+        code = loop_nest(depth)
+        ast, parse_time = timed(parse, code)
+        _, analysis_time = timed(analyze, ast)
+        statements = code.count("\n") + 1 - depth
+        print(f"{depth:5}  {statements:10}  {parse_time:8.4f}  {analysis_time:11.4f}")
+
+# A flat program of declarations, assignments and small if/while statements
+def mixed_program(statements):
+    lines = ["int n = 0", "float f = 1.5"]
+    for i in range(statements):
+        if i % 4 == 0:
+            lines.append(f"int v{i} = (n + {i}) * 2 - n / 3")
+        elif i % 4 == 1:
+            lines.append(f"f = f * 2.0 + {i}.5")
+        elif i % 4 == 2:
+            lines.append(f"if n > {i} {{ n = n + 1 }} else {{ n = n - 1 }}")
+        else:
+            lines.append(f"while n < {i} {{ int t = n  n = t + 1 }}")
+    return "\n".join(lines)
+
+def best_of(runs, function, *args):
+    return min(timed(function, *args)[1] for _ in range(runs))
+
+def parse_with_budget(code, budget):
+    return p0.Parser(p0.Lexer(code, budget=budget).tokenize(), budget=budget).parse()
+
+# Cost of enforcing every Budget limit compared with an unlimited parse
+def bench_budget():
+    code = mixed_program(20000)
+    unlimited = best_of(5, parse, code)
+    def limited():
+        budget = p0.Budget(max_source_bytes=10 ** 9, max_tokens=10 ** 9, max_depth=500,
+                           max_nodes=10 ** 9, max_messages=10 ** 6, max_seconds=600)
+        return parse_with_budget(code, budget)
+    budgeted = best_of(5, limited)
+    print(f"unlimited {unlimited:.4f}s  all limits {budgeted:.4f}s  overhead {100 * (budgeted / unlimited - 1):+.1f}%")
+
+# Longest gap a 1ms ticker task sees while `work` runs on the same event loop
+async def max_tick_gap(work):
+    gaps = []
+    done = False
+    async def ticker():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return elapsed, max(gaps, default=elapsed)
+
+# Event-loop stalls and total time of the sync parse against parse_async
+def bench_async():
+    code = mixed_program(20000)
+    async def sync_parse():
+        parse(code)
+    print("mode              total(s)  max loop stall(ms)")
+    elapsed, gap = asyncio.run(max_tick_gap(sync_parse))
+    print(f"sync parse        {elapsed:8.4f}  {gap * 1000:18.1f}")
+    for slice_size in (256, 1024, 4096):
+        async def async_parse():
+            await p0.parse_async(code, slice_size)
+        elapsed, gap = asyncio.run(max_tick_gap(async_parse))
+        print(f"async slice={slice_size:<5} {elapsed:8.4f}  {gap * 1000:18.1f}")
+    # the same statements as the body of one top-level loop
+    code = "int n = 0\nwhile n < 5 {\n" + code + "\n}"
+    async def nested_parse():
+        await p0.parse_async(code, 256)
+    elapsed, gap = asyncio.run(max_tick_gap(nested_parse))
+    print(f"async one loop    {elapsed:8.4f}  {gap * 1000:18.1f}")
+
+# Diffing a one-statement edit against parsing, as the program grows
+def bench_diff():
+    print("statements  parse(s)  diff(s)")
+    for statements in (1000, 10000, 40000):
+        code = mixed_program(statements)
+        lines = code.split("\n")
+        lines[len(lines) // 2] = "int edited = n * 3"
+        old = parse(code)
+        new, parse_time = timed(parse, "\n".join(lines))
+        changes, diff_time = timed(Diff.diff, old, new)
+        print(f"{statements:10}  {parse_time:8.4f}  {diff_time:7.4f}  {len(changes)} change(s)")
+
+# Sequential parse against ParallelParser, until messages and symbol_table are ready
+# and until every statement has been decoded as well
+def bench_parallel():
+    code = mixed_program(120000)
+    print(f"{len(code) / 1e6:.1f} MB on {os.cpu_count()} CPU(s)")
+    print("mode        parse(s)  +statements(s)")
+    _, sequential = timed(parse, code)
+    print(f"sequential  {sequential:8.4f}  {sequential:14.4f}")
+    for workers in (2, 4, 8):
+        block, elapsed = timed(ParallelParser.ParallelParser(code, workers=workers).parse)
+        _, decode = timed(lambda: block.statements)
+        print(f"workers={workers}   {elapsed:8.4f}  {elapsed + decode:14.4f}")
+
+if __name__ == '__main__':
+    # deep nests recurse once per level in both the parser and the CFG builder
+    sys.setrecursionlimit(10000)
+    bench_dataflow()
+    bench_budget()
+    bench_async()
+    bench_diff()
+    bench_parallel()
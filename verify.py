@@ -1,4 +1,10 @@
+import asyncio
+
 import Parser as p0
+import Dataflow
+import Diff
+import ParallelParser
+import References
 
 count = 0
 def test_parser(test_input, expected_output):
@@ -6,7 +12,6 @@ def test_parser(test_input, expected_output):
     This function runs the lexer and parser on the test input,
     compares the parsed AST with the expected output, and returns the result.
     """
-    global count
     # Initialize the lexer and tokenize the input
     lexer = p0.Lexer(test_input)
     tokens = lexer.tokenize()
@@ -15,7 +20,10 @@ def test_parser(test_input, expected_output):
     ast = parser.parse()
 
 
-    result = parser.messages
+    return test_parser_result(parser.messages, expected_output)
+
+def test_parser_result(result, expected_output):
+    global count
     # Compare the result with the expected output
     if result == expected_output:
         print("Test passed.")
@@ -189,19 +197,443 @@ def test8():
         return 1
     return 0
 
+# Testcase 9: Hash-consing shares repeated subexpressions
+def test9():
+    text9 = '''
+    int a = 10
+    int b = (a + 2) * (a + 2)
+    int c = (a + 2) * (a + 2)
+    '''
+    factory = p0.AST.HashConsFactory()
+    parser = p0.Parser(p0.Lexer(text9).tokenize(), factory)
+    ast = parser.parse()
+    shared = ast.statements[1].expression is ast.statements[2].expression
+    report = [(node.to_string(), uses) for node, uses in factory.cse_report()]
+    expected = [('BinaryOperation(Factor(value=a, type=int), PLUS, Factor(value=2, type=int), type=int)', 4),
+                ('BinaryOperation(BinaryOperation(Factor(value=a, type=int), PLUS, Factor(value=2, type=int), type=int), MULTIPLY, BinaryOperation(Factor(value=a, type=int), PLUS, Factor(value=2, type=int), type=int), type=int)', 2)]
+    if test_parser_result((shared, report, parser.messages), (True, expected, [])) == 0:
+        return 1
+    return 0
+
+# Testcase 10: Dataflow analysis of unused declarations, dead assignments and use before assignment
+def test10():
+    text10 = '''
+    int a = 10
+    int b = a
+    int u = 3
+    while a > 0 {
+      int t = a
+      a = a - 1
+      t = 5
+      b = b + t
+    }
+    int z = z
+    foo(b, z)
+    '''
+    parser = p0.Parser(p0.Lexer(text10).tokenize())
+    result = Dataflow.DataflowAnalysis(parser.parse()).analyze()
+    correctMessages = ['Variable u is declared but never used',
+                       'Value assigned to t is never used',
+                       'Variable z may be used before it is assigned']
+    # a long operator chain parses without recursion, and is analysed without it too
+    chain = "int a = 1\nint b = " + " + ".join(["a"] * 3000) + "\nfoo(b)\n"
+    chained = Dataflow.DataflowAnalysis(p0.Parser(p0.Lexer(chain).tokenize()).parse()).analyze()
+    if test_parser_result((parser.messages, result, chained), ([], correctMessages, [])) == 0:
+        return 1
+    return 0
+
+# Testcase 11: Streaming parse hands out each top-level statement with its own messages
+def test11():
+    text11 = '''
+    int a = 10
+    float b = 10.2
+    if a > 10 {
+      int a = c
+      a = a - 12.456
+    }
+    int a = b
+    '''
+    parser = p0.Parser(p0.tokenize_lines(text11.splitlines(keepends=True)))
+    result = [(type(stmt).__name__, [(str(diagnostic), diagnostic.start, diagnostic.end) for diagnostic in diagnostics])
+              for stmt, diagnostics in parser.iter_statements()]
+    expected = [('Declaration', []),
+                ('Declaration', []),
+                ('IfStatement', [('Variable c has not been declared in the current or any enclosing scopes', 65, 66),
+                                 ('Type Mismatch between int and float', 77, 87)]),
+                ('Declaration', [('Variable a has already been declared in the current scope', 102, 103),
+                                 ('Type Mismatch between int and float', 106, 107)])]
+    if test_parser_result((result, list(parser.symbol_table)), (expected, ['global'])) == 0:
+        return 1
+    return 0
+
+# Testcase 12: Lazy block bodies give the same messages as an eager parse once forced
+def test12():
+    text12 = '''
+    int a = 10
+    float b = 10.2
+    if a > 10 {
+      int a = c
+      int c = a
+      int a = c * b
+    } else {
+      while a > 10 {
+        a = a - 12.456
+        b = b + 1.0
+      }
+    }
+    int c = a
+    '''
+    correctMessages = [
+        'Variable c has not been declared in the current or any enclosing scopes',
+        'Variable a has already been declared in the current scope',
+        'Type Mismatch between int and float',
+        'Type Mismatch between int and float'
+    ]
+    parser = p0.Parser(p0.Lexer(text12).tokenize(), lazy=True)
+    parser.parse()
+    # nothing inside the if/else bodies has been checked yet, and nothing outside them is wrong
+    skimmed = list(parser.messages)
+    parser.force_all()
+    # forcing the else body before the then body still leaves the scopes in scope-number order
+    reordered = p0.Parser(p0.Lexer(text12).tokenize(), lazy=True)
+    reordered.parse().statements[2].else_block.statements
+    reordered.force_all()
+    scopes = ['global', 'scope_1', 'scope_2', 'scope_3']
+    result = (skimmed, parser.messages, list(parser.symbol_table), list(reordered.symbol_table))
+    if test_parser_result(result, ([], correctMessages, scopes, scopes)) == 0:
+        return 1
+    return 0
+
+# Testcase 13: Repeated undeclared names are reported once, and checking stops at max_errors
+def test13():
+    text13 = '''
+    int a = x + x
+    x = a
+    while x > 0 {
+      a = x * 2
+      float a = 1.5
+      int b = y + 1.5
+    }
+    int c = a + 2.5
+    float d = c
+    '''
+    correctMessages = [
+        'Variable x has not been declared in the current or any enclosing scopes',
+        'Variable y has not been declared in the current or any enclosing scopes',
+        'Type Mismatch between int and float',
+    ]
+    parser = p0.Parser(p0.Lexer(text13).tokenize(), max_errors=3, dedupe_undeclared=True)
+    parser.parse()
+    if test_parser_result(parser.messages, correctMessages) == 0:
+        return 1
+    return 0
+
+# Testcase 14: Structural diff reports inserted, deleted and modified statements
+def test14():
+    text14 = '''
+    int a = 10
+    float b = 10.2
+    while a > 0 {
+      a = a - 1
+      b = b * 2.0
+    }
+    foo(a, b)
+    '''
+    edited = '''
+    int a = 10
+    while a > 0 {
+      a = a - 2
+      b = b * 2.0
+    }
+    foo(a, b)
+    int c = a
+    '''
+    old = p0.Parser(p0.Lexer(text14).tokenize()).parse()
+    new = p0.Parser(p0.Lexer(edited).tokenize()).parse()
+    changes = Diff.diff(old, new)
+    # foo(a, b) is modified too: b is undeclared in the edited program, so its type is gone
+    result = [(c.kind, c.old_index, c.new_index) for c in changes]
+    result += [(attribute, [(c.kind, c.old_index, c.new_index) for c in nested]) for attribute, nested in changes[1].nested]
+    expected = [
+        ('deleted', 1, None),
+        ('modified', 2, 1),
+        ('modified', 3, 2),
+        ('inserted', None, 3),
+        ('block', [('modified', 0, 0), ('modified', 1, 1)]),
+    ]
+    spaced = p0.Parser(p0.Lexer(text14.replace('    ', '  ')).tokenize()).parse()
+    if Diff.diff(old, spaced) == [] and test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
+# Testcase 15: A parse split into chunks across worker processes matches a sequential parse
+def test15():
+    text15 = '''
+    int a = 10
+    float b = 10.2
+    if a > 10 {
+      int a = c
+      b = b * 2.0
+    }
+    int a = b
+    while a > 0 {
+      int t = a
+      a = t - 1
+    }
+    float c = a
+    foo(a, c)
+    ''' * 3
+    parser = p0.Parser(p0.Lexer(text15).tokenize())
+    block = parser.parse()
+    chunked = ParallelParser.ParallelParser(text15, workers=2, min_chunk_size=1)
+    chunked_block = chunked.parse()
+    result = ([stmt.to_string() for stmt in chunked_block.statements], chunked.messages,
+              chunked.message_spans, chunked.symbol_table,
+              [(stmt.start, stmt.end, stmt.digest) for stmt in chunked_block.statements], chunked_block.digest)
+    expected = ([stmt.to_string() for stmt in block.statements], parser.messages,
+                parser.message_spans, parser.symbol_table,
+                [(stmt.start, stmt.end, stmt.digest) for stmt in block.statements], block.digest)
+    if len(list(chunked.chunks())) > 1 and test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
+# Testcase 16: Source spans and line:column positions, also with a hash-consing factory
+def test16():
+    text16 = "float f = 1.5\nint a = 1 + 2\nint b = 1 + 2\nint c = f + 1\nint d = f + 1\n"
+    lines = p0.LineIndex(text16)
+    results = []
+    for factory in (None, p0.AST.HashConsFactory()):
+        parser = p0.Parser(p0.Lexer(text16).tokenize(), factory)
+        ast = parser.parse()
+        results.append(([(stmt.start, stmt.end) for stmt in ast.statements], (ast.start, ast.end),
+                        parser.message_spans, parser.located_messages(lines)))
+    # shared expression nodes stand for several places, so they carry no span
+    shared = ast.statements[1].expression
+    empty = p0.Parser(p0.Lexer("   \n ").tokenize()).parse()
+    result = (results, (shared.start, shared.end), (empty.start, empty.end),
+              [lines.line_col(offset) for offset in (0, 13, 14, 69)])
+    spans = ([(0, 13), (14, 27), (28, 41), (42, 55), (56, 69)], (0, 69),
+             [(50, 55), (50, 55), (64, 69), (64, 69)],
+             ['4:9: Type Mismatch between float and int', '4:9: Type Mismatch between int and float',
+              '5:9: Type Mismatch between float and int', '5:9: Type Mismatch between int and float'])
+    expected = ([spans, spans], (None, None), (5, 5), [(1, 1), (1, 14), (2, 1), (5, 14)])
+    if test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
+# Testcase 17: Occurrence index queries, and replacing statements without re-indexing the rest
+def test17():
+    lines = ['int a = 1', 'int b = a + 2', 'if b > a { int c = b  a = c }', 'b = a * 2', 'foo(a, b)']
+    index = References.OccurrenceIndex(p0.Parser(p0.Lexer("\n".join(lines)).tokenize()).parse())
+    a = index.binding('a')
+    result = [(index.uses(a), index.assignments(a), index.at(18), index.at(4), index.at(0))]
+    later = index.entries[2]
+    def replace(i, statement):
+        old_length = len("\n".join(lines))
+        lines[i] = statement
+        new = p0.Parser(p0.Lexer("\n".join(lines)).tokenize()).parse()
+        index.replace_statement(i, new.statements[i], len("\n".join(lines)) - old_length)
+        return new
+    # same global declared first: only statement 1 is walked again, even when re-indented
+    replace(1, '    int b = a + a + 25  ')
+    result.append(index.entries[2] is later)
+    # a new global changes how the statements after it resolve
+    new = replace(3, 'int d = a * 2')
+    fresh = References.OccurrenceIndex(new)
+    code = "\n".join(lines)
+    at = [(found[0].name, found[1]) if found else None for found in map(index.at, range(len(code)))]
+    fresh_at = [(found[0].name, found[1]) if found else None for found in map(fresh.at, range(len(code)))]
+    result.append((at == fresh_at, index.uses(index.binding('a')) == fresh.uses(fresh.binding('a')),
+                   sorted(index.globals), index.uses(index.binding('d'))))
+    chain = "int a = 1\nint b = " + " + ".join(["a"] * 3000)
+    chained = References.OccurrenceIndex(p0.Parser(p0.Lexer(chain).tokenize()).parse())
+    result.append(len(chained.uses(chained.binding('a'))))
+    expected = [([18, 31, 58, 68], [4, 46], (a, 'use'), (a, 'declaration'), None), True, (True, True, ['a', 'b', 'd'], []), 3000]
+    if test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
+# Testcase 18: Every Budget limit stops the lexer or parser with BudgetExceeded
+def test18():
+    def exceeded(run):
+        try:
+            run()
+        except p0.BudgetExceeded as error:
+            return error.limit
+        return None
+    def parse(code, budget):
+        return p0.Parser(p0.Lexer(code, budget=budget).tokenize(), budget=budget).parse()
+    def lazy(code, budget):
+        parser = p0.Parser(p0.Lexer(code, budget=budget).tokenize(), lazy=True, budget=budget)
+        parser.parse()
+        parser.force_all()
+    program = "int a = 1\nfloat b = a\nint c = b\nint d = a + 1\n" * 10
+    nested_loops = "int a = 1\n" + "while a > 0 {\n" * 10 + "a = a - 1\n" + "}\n" * 10
+    nested = "int a = " + "(" * 400 + "1" + ")" * 400
+    result = [
+        exceeded(lambda: parse(program, p0.Budget(max_source_bytes=100))),
+        exceeded(lambda: parse(program, p0.Budget(max_tokens=50))),
+        # a streamed source is only counted by the parser: 53 tokens, EOF included
+        exceeded(lambda: p0.Parser(p0.tokenize_lines(["int a = 1\n"] * 13), budget=p0.Budget(max_tokens=52)).parse()),
+        exceeded(lambda: p0.Parser(p0.tokenize_lines(["int a = 1\n"] * 13), budget=p0.Budget(max_tokens=53)).parse()),
+        exceeded(lambda: parse("int a = 1\n" + "while a > 0 {\n" * 4 + "a = a - 1\n" + "}\n" * 4, p0.Budget(max_depth=3))),
+        # lazy bodies are counted at the depth they were deferred at
+        exceeded(lambda: lazy(nested_loops, p0.Budget(max_depth=3))),
+        exceeded(lambda: lazy(nested_loops, p0.Budget(max_depth=10))),
+        # deeper than the Python stack allows: still BudgetExceeded, not RecursionError
+        exceeded(lambda: parse(nested, p0.Budget(max_depth=500))),
+        exceeded(lambda: parse(program, p0.Budget(max_nodes=20, check_interval=8))),
+        exceeded(lambda: parse(program, p0.Budget(max_messages=5))),
+        exceeded(lambda: parse(program, p0.Budget(max_seconds=0, check_interval=1))),
+        exceeded(lambda: parse(program, p0.Budget(max_source_bytes=10 ** 6, max_tokens=10 ** 6, max_depth=50,
+                                                  max_nodes=10 ** 6, max_messages=100, max_seconds=60))),
+    ]
+    expected = ['max_source_bytes', 'max_tokens', 'max_tokens', None, 'max_depth', 'max_depth', None, 'max_depth', 'max_nodes', 'max_messages',
+                'max_seconds', None]
+    if test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
+# Testcase 19: parse_async pauses inside a large loop body, matches parse() and can be cancelled
+def test19():
+    text19 = "int a = 10\nfloat b = 1.5\nwhile a > 0 {\n" + "a = a - 1\nb = b * a\nint c = b\n" * 200 + "}\n"
+    parser = p0.Parser(p0.Lexer(text19).tokenize())
+    expected_ast = parser.parse()
+
+    async def run():
+        ticks = 0
+        done = False
+        async def ticker():
+            nonlocal ticks
+            while not done:
+                ticks += 1
+                await asyncio.sleep(0)
+        task = asyncio.create_task(ticker())
+        ast, async_parser = await p0.parse_async(text19, slice_size=64)
+        done = True
+        await task
+        # cancel a second parse after its first slice
+        cancelled = p0.Parser(p0.Lexer(text19).tokenize())
+        parse = asyncio.create_task(cancelled.parse_async(slice_size=64))
+        await asyncio.sleep(0)
+        parse.cancel()
+        try:
+            await parse
+        except asyncio.CancelledError:
+            pass
+        return ast, async_parser, ticks, parse.cancelled(), cancelled.current_token[0]
+
+    ast, async_parser, ticks, was_cancelled, stopped_at = asyncio.run(run())
+    result = (ast.to_string(), async_parser.messages, ticks >= 10, was_cancelled, stopped_at != 'EOF')
+    expected = (expected_ast.to_string(), parser.messages, True, True, True)
+    if test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
+# Testcase 20: Scope tree position queries after eager, lazy and chunked parses
+def test20():
+    text20 = '''int a = 1
+if a > 0 {
+  float b = 2.5
+  while a > 0 {
+    int a = 3
+    a = a - 1.5
+  }
+} else {
+  int c = a
+}
+float d = 1.5
+'''
+    def queries(tree):
+        return [(tree.scope_at(offset).name, tree.lookup('a', offset), tree.lookup('b', offset), tree.visible_at(offset))
+                for offset in (-5, 0, 25, 50, 64, 107, 200)]
+    eager = p0.Parser(p0.Lexer(text20).tokenize())
+    eager.parse()
+    lazy = p0.Parser(p0.Lexer(text20).tokenize(), lazy=True)
+    lazy.parse()
+    lazy.force_all()
+    chunked = ParallelParser.ParallelParser(text20, workers=2, min_chunk_size=1)
+    chunked.parse()
+    result = [queries(eager.scope_tree), queries(lazy.scope_tree), queries(chunked.scope_tree)]
+    expected = [
+        ('global', None, None, {}),
+        ('global', None, None, {}),
+        ('scope_1', 'int', None, {'a': 'int'}),
+        ('scope_1', 'int', 'float', {'b': 'float', 'a': 'int'}),
+        ('scope_2', 'int', 'float', {'a': 'int', 'b': 'float'}),
+        ('scope_3', 'int', None, {'c': 'int', 'a': 'int'}),
+        ('global', 'int', None, {'a': 'int', 'd': 'float'}),
+    ]
+    if test_parser_result(result, [expected] * 3) == 0:
+        return 1
+    return 0
+
+# Testcase 21: messages stays a plain list, max_errors only stops reporting, and lazy mode refuses order-dependent options and streaming
+def test21():
+    text21 = '''
+    int a = 1
+    x = 1
+    int b = a + a
+    if a > 0 {
+      float a = b
+    }
+    '''
+    parser = p0.Parser(p0.Lexer(text21).tokenize(), max_errors=1)
+    ast = parser.parse()
+    typed = ast.statements[2].expression.value_type
+    parser.messages.append('note')
+    appended = list(parser.messages)
+    parser.messages = []
+    lazy = p0.Parser(p0.Lexer(text21).tokenize(), lazy=True)
+    lazy.parse()
+    lazy.messages.append('note')
+    lazy.force_all()
+    rejected = []
+    for options in ({'max_errors': 2}, {'dedupe_undeclared': True}):
+        try:
+            p0.Parser(p0.Lexer(text21).tokenize(), lazy=True, **options)
+        except ValueError:
+            rejected.append(options)
+    try:
+        next(p0.Parser(p0.Lexer(text21).tokenize(), lazy=True).iter_statements())
+    except ValueError:
+        rejected.append('iter_statements')
+    undeclared = 'Variable x has not been declared in the current or any enclosing scopes'
+    result = (typed, appended, parser.messages, lazy.messages, rejected)
+    expected = ('int', [undeclared, 'note'], [], [undeclared, 'Type Mismatch between float and int', 'note'],
+                [{'max_errors': 2}, {'dedupe_undeclared': True}, 'iter_statements'])
+    if test_parser_result(result, expected) == 0:
+        return 1
+    return 0
+
 # Running all tests and counting passes
-passed = 0
-test1()
-test2()
-test3()
-test4()
-test5()
-test6()
-test7()
-test8()
-print(count)
-
-if count == 8:
-    print(f"All {count} test cases are passed") 
-else:
-    print(f"Only {count} testcases are passed, pls fix the logic")
\ No newline at end of file
+if __name__ == '__main__':
+    # ParallelParser's worker processes may import this module again
+    passed = 0
+    test1()
+    test2()
+    test3()
+    test4()
+    test5()
+    test6()
+    test7()
+    test8()
+    test9()
+    test10()
+    test11()
+    test12()
+    test13()
+    test14()
+    test15()
+    test16()
+    test17()
+    test18()
+    test19()
+    test20()
+    test21()
+    print(count)
+
+    if count == 21:
+        print(f"All {count} test cases are passed") 
+    else:
+        print(f"Only {count} testcases are passed, pls fix the logic")
\ No newline at end of file